@@ -1,4 +1,5 @@
 import os
+import pytest
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
@@ -37,3 +38,19 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(scope='session', autouse=True)
+def temporary_cache_file():
+    from core.test_runner import temporary_cache
+
+    with temporary_cache():
+        yield
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    # БД каждого теста откатывается, а кэш нет.
+    from django.core.cache import cache
+
+    cache.clear()
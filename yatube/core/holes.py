@@ -0,0 +1,47 @@
+import re
+from urllib.parse import parse_qsl, urlencode
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+HOLES = {}
+PLACEHOLDER = '<!--hole:{name}:{params}-->'
+PLACEHOLDER_RE = re.compile(r'<!--hole:([\w-]+):([^>]*)-->')
+
+
+def register(name):
+    """Регистрирует функцию (request, **params) -> HTML для дырки name."""
+    def decorator(func):
+        HOLES[name] = func
+        return func
+    return decorator
+
+
+def render_hole(request, name, **params):
+    return HOLES[name](request, **params)
+
+
+def placeholder(name, **params):
+    # Параметры проходят через urlencode, поэтому '>' в метку не попадёт.
+    return mark_safe(PLACEHOLDER.format(name=name, params=urlencode(params)))
+
+
+def fill_holes(request, response):
+    """Заполняет метки в общем для всех HTML ответа данными request.user.
+
+    Тело страницы кэшируется один раз для всех пользователей, а мелкие
+    персональные фрагменты (меню, кнопки) дорисовываются при отдаче.
+    """
+    content = response.content.decode(response.charset)
+    response.content = PLACEHOLDER_RE.sub(
+        lambda match: render_hole(
+            request, match.group(1), **dict(parse_qsl(match.group(2)))
+        ),
+        content,
+    )
+    return response
+
+
+@register('user_menu')
+def user_menu(request):
+    return render_to_string('includes/user_menu.html', request=request)
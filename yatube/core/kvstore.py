@@ -0,0 +1,68 @@
+import threading
+
+from django.core.cache import caches
+from django.core.signals import request_finished
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+
+_local = threading.local()
+
+
+def _prefetched():
+    if not hasattr(_local, 'values'):
+        _local.values = {}
+    return _local.values
+
+
+def _forget_prefetched(**kwargs):
+    _prefetched().clear()
+
+
+request_finished.connect(_forget_prefetched)
+
+
+class CacheKVStore(KVStoreBase):
+    """Метаданные sorl-thumbnail только в кэше Django, без запросов к БД.
+
+    prefetch() читает записи для целой страницы одним get_many, и теги
+    {% thumbnail %} берут их из памяти до конца запроса. Вытесненная из
+    кэша запись восстанавливается сама: sorl увидит готовый файл миниатюры
+    и лишь заново запишет его размеры. Перечислять ключи кэш не умеет,
+    поэтому cleanup() и clear() ничего не делают — для полной очистки
+    достаточно очистить кэш.
+    """
+
+    @property
+    def cache(self):
+        return caches[settings.THUMBNAIL_CACHE]
+
+    def prefetch(self, image_files):
+        prefetched = _prefetched()
+        keys = [
+            key for key in {add_prefix(image.key) for image in image_files}
+            if key not in prefetched
+        ]
+        if not keys:
+            return
+        found = self.cache.get_many(keys)
+        # Промахи тоже запоминаем, чтобы не спрашивать кэш о них снова.
+        prefetched.update({key: found.get(key) for key in keys})
+
+    def _get_raw(self, key):
+        prefetched = _prefetched()
+        if key in prefetched:
+            return prefetched[key]
+        return self.cache.get(key)
+
+    def _set_raw(self, key, value):
+        self.cache.set(key, value, settings.THUMBNAIL_CACHE_TIMEOUT)
+        _prefetched().pop(key, None)
+
+    def _delete_raw(self, *keys):
+        self.cache.delete_many(keys)
+        prefetched = _prefetched()
+        for key in keys:
+            prefetched.pop(key, None)
+
+    def _find_keys_raw(self, prefix):
+        return []
@@ -0,0 +1,51 @@
+import logging
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def query_budget(max_queries):
+    """Считает SQL-запросы вью и сверяет их с бюджетом.
+
+    Число запросов пишется в request.query_count и заголовок
+    X-Query-Count. Превышение бюджета — предупреждение в лог, а при
+    QUERY_BUDGET_STRICT (в тестах) — исключение QueryBudgetExceeded.
+    DEBUG тут ни при чём: к моменту проверки вью уже могла что-то
+    записать, и ошибка 500 пользователю хуже лишнего запроса.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                response = view(request, *args, **kwargs)
+            request.query_count = counter.count
+            response['X-Query-Count'] = counter.count
+            if counter.count > max_queries:
+                message = (
+                    f'{view.__name__}: {counter.count} SQL-запросов '
+                    f'при бюджете {max_queries}'
+                )
+                if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+        wrapper.max_queries = max_queries
+        return wrapper
+    return decorator
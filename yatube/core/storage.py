@@ -0,0 +1,49 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы называются по SHA-256 содержимого: upload_to/ab/cd/<hash>.ext.
+
+    Одинаковые загрузки хранятся одним файлом, а два уровня каталогов
+    по префиксу хэша не дают одной папке разрастись до миллионов файлов.
+    Файлы без ссылок удаляет команда collect_media_garbage.
+    """
+
+    @staticmethod
+    def digest(content):
+        sha = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(CHUNK_SIZE):
+            sha.update(chunk)
+        content.seek(0)
+        return sha.hexdigest()
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = self.digest(content)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        ).replace('\\', '/')
+        if self.exists(name):
+            try:
+                # Повторная загрузка молодит файл: collect_media_garbage не
+                # тронет его, пока новый пост не закоммичен.
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # Файл успели удалить между проверками — пишем заново.
+                pass
+        return super().save(name, content, max_length)
@@ -0,0 +1,18 @@
+from django import template
+
+from ..holes import placeholder, render_hole
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **params):
+    """Персональный фрагмент страницы.
+
+    Если страница собирается для общего кэша (request.punch_holes), на месте
+    фрагмента остаётся метка, иначе он отрисовывается сразу.
+    """
+    request = context.get('request')
+    if getattr(request, 'punch_holes', False):
+        return placeholder(name, **params)
+    return render_hole(request, name, **params)
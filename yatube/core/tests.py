@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings
+)
+
+from .cache import SQLiteCache
+from .query_budget import QueryBudgetExceeded, query_budget
+
+
+def increment_many(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'value': [1, 2]})
+        self.assertTrue(self.cache.has_key('key'))
+        self.assertTrue(self.cache.delete('key'))
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get('key', 'default'), 'default')
+
+    def test_expired_entries_are_invisible(self):
+        self.cache.set('key', 'value', 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_add_does_not_overwrite_live_entry(self):
+        self.assertTrue(self.cache.add('key', 'first'))
+        self.assertFalse(self.cache.add('key', 'second'))
+        self.assertEqual(self.cache.get('key'), 'first')
+
+    def test_incr_and_decr(self):
+        self.cache.set('counter', 10)
+        self.assertEqual(self.cache.incr('counter'), 11)
+        self.assertEqual(self.cache.decr('counter', 5), 6)
+        self.assertIs(self.cache.get('counter'), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('text', 'не число')
+        with self.assertRaises(ValueError):
+            self.cache.incr('text')
+
+    def test_big_integers_are_pickled(self):
+        for value in (2 ** 64, -2 ** 63 - 1, 2 ** 63 - 1):
+            with self.subTest(value=value):
+                self.cache.set('key', value)
+                self.assertEqual(self.cache.get('key'), value)
+
+    def test_bulk_operations(self):
+        self.cache.set_many({f'key-{i}': i for i in range(1000)})
+        keys = [f'key-{i}' for i in range(1000)] + ['missing']
+        self.assertEqual(
+            self.cache.get_many(keys), {f'key-{i}': i for i in range(1000)}
+        )
+        self.cache.delete_many(keys[:500])
+        self.assertEqual(len(self.cache.get_many(keys)), 500)
+        self.cache.clear()
+        self.assertEqual(self.cache.get_many(keys), {})
+
+    def test_entries_are_shared_between_instances(self):
+        other = SQLiteCache(self.location, {})
+        self.cache.set('key', 'value')
+        self.assertEqual(other.get('key'), 'value')
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(
+                target=increment_many, args=(self.location, 50)
+            )
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_culls_when_over_max_entries(self):
+        cache = SQLiteCache(
+            self.location, {'OPTIONS': {'MAX_ENTRIES': 50}}
+        )
+        for i in range(200):
+            cache.set(f'key-{i}', i)
+        self.assertLess(
+            len(cache.get_many([f'key-{i}' for i in range(200)])), 200
+        )
+
+
+@query_budget(1)
+def two_queries(request):
+    get_user_model().objects.count()
+    get_user_model().objects.count()
+    return HttpResponse()
+
+
+class QueryBudgetTests(TestCase):
+    @override_settings(DEBUG=True, QUERY_BUDGET_STRICT=False)
+    def test_overrun_is_logged_even_with_debug(self):
+        with self.assertLogs('core.query_budget', 'WARNING'):
+            response = two_queries(RequestFactory().get('/'))
+        self.assertEqual(response['X-Query-Count'], '2')
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_overrun_raises_in_strict_mode(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            two_queries(RequestFactory().get('/'))
@@ -6,3 +6,6 @@ class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name = 'Публикации'
     verbose_name_plural = 'Публикации'
+
+    def ready(self):
+        from . import holes, signals  # noqa: F401
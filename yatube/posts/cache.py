@@ -0,0 +1,422 @@
+import copy
+import hashlib
+import math
+import random
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from core.holes import fill_holes
+
+from . import constants
+from .models import Post
+
+VERSION_KEY = 'posts:version:{}'
+COUNT_KEY = 'posts:count:{}'
+PAGE_KEY = 'posts:page:{name}:{versions}:{user}:{path}'
+WRITE_WATERMARK_KEY = 'posts_write_watermark'
+OBJECT_KEY = 'posts:object:{label}:{field}:{value}'
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def get_versions(*scopes):
+    """Текущие версии областей кэша, недостающие создаются на лету."""
+    keys = {VERSION_KEY.format(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, _new_version(), None)
+        found[key] = cache.get(key)
+    return {scope: found[key] for key, scope in keys.items()}
+
+
+def request_versions(request, scopes):
+    """get_versions() с запоминанием на время запроса."""
+    memo = request.__dict__.setdefault('_cache_versions', {})
+    scopes = tuple(scopes)
+    if scopes not in memo:
+        memo[scopes] = get_versions(*scopes)
+    return memo[scopes]
+
+
+def bump_versions(*scopes):
+    """Инвалидирует всё, что закэшировано под этими областями."""
+    version = _new_version()
+    cache.set_many(
+        {VERSION_KEY.format(scope): version for scope in scopes}, None
+    )
+
+
+def get_count(scope, queryset):
+    """Число записей из кэша; при промахе считается один раз."""
+    key = COUNT_KEY.format(scope)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.add(key, count, constants.COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def shift_counts(delta, *scopes):
+    for scope in scopes:
+        try:
+            cache.incr(COUNT_KEY.format(scope), delta)
+        except ValueError:
+            # Счётчика ещё нет: его посчитает следующий get_count().
+            pass
+
+
+def _object_key(model, field, value):
+    return OBJECT_KEY.format(
+        label=model._meta.label_lower, field=field, value=value
+    )
+
+
+def _detached(obj):
+    # Связанные объекты живут в кэше отдельно и обновляются своими
+    # сигналами, поэтому в копию они не попадают.
+    obj = copy.copy(obj)
+    obj._state = copy.copy(obj._state)
+    obj._state.fields_cache = {}
+    obj.__dict__.pop('_prefetched_objects_cache', None)
+    return obj
+
+
+def cache_objects(*objects):
+    """Кладёт объекты в кэш по первичному ключу (write-through)."""
+    cache.set_many({
+        _object_key(type(obj), 'pk', obj.pk): _detached(obj)
+        for obj in objects
+        if obj is not None and not obj.get_deferred_fields()
+    }, constants.OBJECT_CACHE_TIMEOUT)
+
+
+def cache_aliases(obj, *fields):
+    """Запоминает pk объекта по его уникальным полям."""
+    if not fields:
+        return
+    cache.set_many({
+        _object_key(type(obj), field, getattr(obj, field)): obj.pk
+        for field in fields
+    }, constants.OBJECT_CACHE_TIMEOUT)
+
+
+def forget_objects(*objects, aliases=()):
+    cache.delete_many([
+        _object_key(type(obj), field, getattr(obj, field))
+        for obj in objects
+        for field in ('pk', *aliases)
+    ])
+
+
+def _attach_related(obj, related):
+    fields = [obj._meta.get_field(name) for name in related]
+    keys = {
+        field: _object_key(
+            field.related_model, 'pk', getattr(obj, field.attname)
+        )
+        for field in fields
+        if getattr(obj, field.attname) is not None
+    }
+    found = cache.get_many(keys.values())
+    for field, key in keys.items():
+        target = found.get(key)
+        if target is None:
+            target = field.related_model._default_manager.filter(
+                pk=getattr(obj, field.attname)
+            ).first()
+            if target is None:
+                # Ссылка устарела: связанный объект удалён, а кэшированная
+                # копия об этом не знает.
+                return False
+            cache_objects(target)
+        setattr(obj, field.name, target)
+    return True
+
+
+def get_cached_object_or_404(model, related=(), **lookup):
+    """get_object_or_404 через кэш объектов.
+
+    lookup — одно поле: pk или уникальное (slug, username). По уникальному
+    полю в кэше хранится только pk, а совпадение поля проверяется у самого
+    объекта, так что переименование не требует инвалидации. Внешние ключи
+    из related берутся из кэша отдельными записями.
+    """
+    (field, value), = lookup.items()
+    if field == 'pk':
+        pk = value
+    else:
+        pk = cache.get(_object_key(model, field, value))
+    obj = None
+    if pk is not None:
+        obj = cache.get(_object_key(model, 'pk', pk))
+        if obj is not None and field != 'pk' and getattr(obj, field) != value:
+            obj = None
+    if obj is not None:
+        if _attach_related(obj, related):
+            return obj
+        forget_objects(obj)
+    obj = get_object_or_404(model.objects.select_related(*related), **lookup)
+    cache_objects(obj, *(getattr(obj, name) for name in related))
+    if field != 'pk':
+        cache_aliases(obj, field)
+    return obj
+
+
+def post_count_scopes(group_id):
+    # Посты автора считает UserStats.posts.
+    scopes = ['posts']
+    if group_id:
+        scopes.append(f'group:{group_id}')
+    return scopes
+
+
+def _is_stale(entry, early_refresh_beta):
+    now = time.time()
+    if early_refresh_beta:
+        # XFetch: чем дороже пересборка и ближе срок, тем вероятнее
+        # обновить запись заранее, пока остальные ещё читают старую.
+        now -= (
+            entry['delta'] * early_refresh_beta
+            * math.log(1 - random.random())
+        )
+    return now >= entry['expires']
+
+
+def _rebuild(key, rebuild, timeout, cacheable):
+    started = time.monotonic()
+    value = rebuild()
+    if cacheable(value):
+        cache.set(key, {
+            'value': value,
+            'built': time.time(),
+            'expires': time.time() + timeout,
+            'delta': time.monotonic() - started,
+        }, timeout + constants.CACHE_STALE_TIMEOUT)
+    return value
+
+
+def _wait_for(key, wait):
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def cached(key, rebuild, timeout, early_refresh_beta=0,
+           cacheable=lambda value: True, wait=constants.REBUILD_WAIT,
+           fresh_after=None):
+    """Кэширование с защитой от лавины пересборок (single-flight).
+
+    Запись живёт дольше своего срока на CACHE_STALE_TIMEOUT. Когда срок
+    вышел, пересобирает её только запрос, взявший блокировку, остальные
+    получают старое значение. Если значения нет совсем, остальные ждут
+    до wait секунд. early_refresh_beta > 0 включает вероятностное
+    обновление до истечения срока. Запись, собранная раньше fresh_after,
+    считается отсутствующей и пересобирается сразу, без ожидания.
+    """
+    entry = cache.get(key)
+    if fresh_after is not None and (
+        entry is None or entry.get('built', 0) < fresh_after
+    ):
+        return _rebuild(key, rebuild, timeout, cacheable)
+    if entry is not None and not _is_stale(entry, early_refresh_beta):
+        return entry['value']
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, True, constants.REBUILD_LOCK_TIMEOUT):
+        if entry is None:
+            entry = _wait_for(key, wait)
+        if entry is not None:
+            return entry['value']
+        # Сборщик не успел: считаем сами, его блокировку не трогаем.
+        return _rebuild(key, rebuild, timeout, cacheable)
+    try:
+        return _rebuild(key, rebuild, timeout, cacheable)
+    finally:
+        cache.delete(lock_key)
+
+
+def mark_write(request):
+    """Запоминает в сессии момент записи пользователя.
+
+    Пока не прошло WRITE_WATERMARK_TIMEOUT, его страницы из кэша не старше
+    этой отметки: автор сразу видит свои изменения, даже те, что не сдвинули
+    версии областей. Остальные пользователи читают кэш как обычно.
+    """
+    request.session[WRITE_WATERMARK_KEY] = time.time()
+
+
+def write_watermark(request):
+    session = getattr(request, 'session', None)
+    if session is None:
+        return None
+    watermark = session.get(WRITE_WATERMARK_KEY)
+    if watermark is None:
+        return None
+    if time.time() - watermark > constants.WRITE_WATERMARK_TIMEOUT:
+        del session[WRITE_WATERMARK_KEY]
+        return None
+    return watermark
+
+
+def post_scopes(post):
+    scopes = ['posts', f'post:{post.pk}', f'author:{post.author.username}']
+    if post.group_id:
+        scopes.append(f'group:{post.group.slug}')
+    return scopes
+
+
+# Области страниц: от чего зависит содержимое каждой вью.
+def index_scopes(request):
+    return ('posts',)
+
+
+def group_scopes(request, slug):
+    return (f'group:{slug}',)
+
+
+def profile_scopes(request, username):
+    return (f'author:{username}',)
+
+
+def follow_scopes(request):
+    return (f'follow:{request.user.pk}',)
+
+
+def post_detail_scopes(request, post_id):
+    # Страница показывает имя и счётчики автора и название группы.
+    post = get_cached_object_or_404(
+        Post, related=('author', 'group'), pk=post_id
+    )
+    scopes = [f'post:{post.pk}', f'author:{post.author.username}']
+    if post.group_id:
+        scopes.append(f'group:{post.group.slug}')
+    return scopes
+
+
+def page_key(name, request, versions, per_user=True):
+    if not per_user:
+        # Одна копия на всех вошедших и одна на анонимов.
+        user = 'users' if request.user.is_authenticated else 'guests'
+    elif request.user.is_authenticated:
+        user = request.user.pk
+    else:
+        user = 'anon'
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return PAGE_KEY.format(
+        name=name,
+        versions='.'.join(str(versions[scope]) for scope in sorted(versions)),
+        user=user,
+        path=path,
+    )
+
+
+def _cacheable_response(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def cache_page_versioned(get_scopes, timeout=constants.PAGE_CACHE_TIMEOUT,
+                         early_refresh_beta=0, per_user=False):
+    """Замена @cache_page: ключ страницы содержит версии её областей.
+
+    get_scopes(request, *args, **kwargs) возвращает области, от которых
+    зависит страница. Сигналы моделей меняют версии областей, поэтому
+    страницы можно держать в кэше долго и не показывать устаревшее.
+    Пересборка идёт через cached(), то есть по одной на страницу.
+
+    Страница собирается с метками вместо персональных фрагментов ({% hole %})
+    и хранится одна на всех вошедших и одна на анонимов; фрагменты
+    заполняются при каждой отдаче. per_user=True — для страниц, целиком
+    зависящих от пользователя.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            versions = request_versions(
+                request, get_scopes(request, *args, **kwargs)
+            )
+            request.punch_holes = True
+            try:
+                response = cached(
+                    page_key(view.__name__, request, versions, per_user),
+                    lambda: view(request, *args, **kwargs),
+                    timeout,
+                    early_refresh_beta=early_refresh_beta,
+                    cacheable=_cacheable_response,
+                    fresh_after=write_watermark(request),
+                )
+            finally:
+                request.punch_holes = False
+            return fill_holes(request, response)
+        return wrapper
+    return decorator
+
+
+def conditional_page(get_scopes):
+    """ETag и Last-Modified из версий областей, без обращения к БД.
+
+    Версия — время последнего изменения области в наносекундах, поэтому
+    самая свежая из них годится и для Last-Modified. Пока у запроса есть
+    непоказанные сообщения или свежая отметка записи (mark_write),
+    валидаторы не отдаются: страницу надо отрисовать. Ответы помечаются
+    Cache-Control: private, no-cache — браузер хранит их, но каждый раз
+    переспрашивает сервер.
+    """
+    def must_render(request):
+        return bool(len(get_messages(request)) or write_watermark(request))
+
+    def versions(request, *args, **kwargs):
+        return request_versions(
+            request, get_scopes(request, *args, **kwargs)
+        )
+
+    def etag(request, *args, **kwargs):
+        if must_render(request):
+            return None
+        key = page_key('etag', request, versions(request, *args, **kwargs))
+        # Формы страницы содержат CSRF-токен, а вход в аккаунт меняет его
+        # секрет: страница с ним должна перерисоваться.
+        get_token(request)
+        key += request.META['CSRF_COOKIE']
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if must_render(request):
+            return None
+        changed = datetime.fromtimestamp(
+            max(versions(request, *args, **kwargs).values()) / 10 ** 9,
+            tz=timezone.utc,
+        )
+        last_login = getattr(request.user, 'last_login', None)
+        if last_login is not None:
+            changed = max(changed, last_login)
+        return changed
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=etag, last_modified_func=last_modified
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # Без no-cache браузер может по эвристике вовсе не спросить
+            # сервер и не увидеть ни изменений, ни своих же записей.
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -1,5 +1,37 @@
 POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
 SELF_TEXT_LENGTH = 15
 TEXT_LENGTH_MINIMAL = 10
 COMMENT_LENGTH_MINIMAL = 10
 SLUG_MAX_LENGTH = 30
+PAGE_CACHE_TIMEOUT = 60 * 60 * 12
+COUNT_CACHE_TIMEOUT = 60 * 60
+CACHE_STALE_TIMEOUT = 60 * 5
+REBUILD_LOCK_TIMEOUT = 30
+REBUILD_WAIT = 2
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+WRITE_WATERMARK_TIMEOUT = 60
+OBJECT_CACHE_TIMEOUT = 60 * 60
+FOLLOWING_CACHE_TIMEOUT = 60 * 60 * 24
+PAGE_WINDOW_ON_EACH_SIDE = 3
+PAGE_WINDOW_ON_ENDS = 1
+# Картинка поста обрезается до 960x339; для srcset готовятся варианты
+# нескольких ширин в JPEG и в современных форматах, если Pillow их умеет.
+IMAGE_CROP_SIZE = (960, 339)
+IMAGE_VARIANT_WIDTHS = (480, 720, 960)
+IMAGE_VARIANT_FORMATS = ('AVIF', 'WEBP')
+# Загрузка картинок: размер файла и число пикселей проверяются по
+# заголовку до декодирования, длинная сторона ужимается до IMAGE_MAX_SIDE.
+IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+IMAGE_MAX_PIXELS = 50 * 10 ** 6
+IMAGE_MAX_SIDE = 2560
+IMAGE_JPEG_QUALITY = 85
+# Загрузка, чей dHash отличается от сохранённого не больше чем на столько
+# бит, — кандидат в повторы уже сохранённого файла. Должно быть
+# меньше числа полос ImageHash, иначе поиск по полосам пропустит повторы.
+IMAGE_DUPLICATE_DISTANCE = 3
+# ...и если средняя разница цветов уменьшенных копий (0–255) не больше этой.
+IMAGE_DUPLICATE_COLOR_DIFFERENCE = 8
+# Повтор подтверждается в полном разрешении: средняя разница точек в каждом
+# блоке 8x8 должна быть не больше этой (0–255).
+IMAGE_DUPLICATE_BLOCK_DIFFERENCE = 12
@@ -0,0 +1,43 @@
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+from . import constants
+from .models import Follow
+
+FOLLOWING_KEY = 'posts:following:{}'
+
+
+def followed_author_ids(user_id):
+    """Отсортированный массив id авторов, на которых подписан пользователь.
+
+    Хранится в кэше одной записью; сигналы подписок её сбрасывают.
+    """
+    key = FOLLOWING_KEY.format(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = array('q', Follow.objects.filter(
+            user_id=user_id
+        ).order_by('author_id').values_list('author_id', flat=True))
+        cache.set(key, ids, constants.FOLLOWING_CACHE_TIMEOUT)
+    return ids
+
+
+def _contains(ids, author_id):
+    index = bisect_left(ids, author_id)
+    return index < len(ids) and ids[index] == author_id
+
+
+def followed_among(user_id, author_ids):
+    """Те из author_ids, на кого подписан пользователь, без запросов к БД."""
+    ids = followed_author_ids(user_id)
+    return {author_id for author_id in author_ids if _contains(ids, author_id)}
+
+
+def is_following(user_id, author_id):
+    return _contains(followed_author_ids(user_id), author_id)
+
+
+def forget_following(user_id):
+    cache.delete(FOLLOWING_KEY.format(user_id))
@@ -1,5 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .image_hashes import find_duplicate, fingerprint, remember_hash
+from .images import normalize_image
 from .models import Post, Comment
 from . import constants
 
@@ -23,6 +26,29 @@ class PostForm(forms.ModelForm):
                                         ' 10 символов.')
         return data
 
+    image_fingerprint = None
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # Уже сохранённый файл поста не трогаем, только новую загрузку.
+        if not isinstance(image, UploadedFile):
+            return image
+        image = normalize_image(image)
+        value, colors = fingerprint(image)
+        # Та же картинка, лишь пережатая, получает имя готового файла
+        # вместе с его миниатюрами.
+        duplicate = find_duplicate(image, value, colors)
+        if duplicate:
+            return duplicate
+        self.image_fingerprint = value, colors
+        return image
+
+    def save(self, commit=True):
+        post = super().save(commit)
+        if commit and self.image_fingerprint is not None:
+            remember_hash(post.image.name, *self.image_fingerprint)
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
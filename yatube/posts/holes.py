@@ -0,0 +1,29 @@
+from django.template.loader import render_to_string
+
+from core.holes import register
+
+from .follows import is_following
+
+
+@register('feed_switcher')
+def feed_switcher(request, active):
+    if not request.user.is_authenticated:
+        return ''
+    return render_to_string(
+        'posts/includes/switcher.html', {'active': active}
+    )
+
+
+@register('follow_button')
+def follow_button(request, author, author_id):
+    author_id = int(author_id)
+    if request.user.is_authenticated:
+        if request.user.pk == author_id:
+            return ''
+        following = is_following(request.user.pk, author_id)
+    else:
+        following = False
+    return render_to_string('posts/includes/follow_button.html', {
+        'author': author,
+        'following': following,
+    })
@@ -0,0 +1,142 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from PIL import Image, ImageChops
+
+from . import constants
+from .models import ImageHash, Post
+
+HASH_SIZE = 8
+BAND_BITS = 16
+BANDS = 64 // BAND_BITS
+BLOCK_SIZE = 8
+
+
+def fingerprint(file):
+    """(dHash, цвета) картинки.
+
+    dHash — 64 бита: знаки перепадов яркости соседних точек в картинке,
+    уменьшенной до 9x8 в оттенках серого. Он почти не меняется от
+    пережатия, масштаба и мелких правок, но не видит цвета. Поэтому к нему
+    прилагаются цвета картинки, уменьшенной до 8x8 RGB.
+    """
+    file.seek(0)
+    with Image.open(file) as image:
+        # JPEG декодируется сразу в сильно уменьшенном масштабе.
+        image.draft('RGB', (HASH_SIZE * 8, HASH_SIZE * 8))
+        image = image.convert('RGB')
+        pixels = list(
+            image.convert('L')
+            .resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+            .getdata()
+        )
+        colors = image.resize((HASH_SIZE, HASH_SIZE), Image.LANCZOS).tobytes()
+    file.seek(0)
+    value = 0
+    for row in range(HASH_SIZE):
+        start = row * (HASH_SIZE + 1)
+        for left, right in zip(
+            pixels[start:start + HASH_SIZE],
+            pixels[start + 1:start + HASH_SIZE + 1],
+        ):
+            value = value << 1 | (right > left)
+    return value, colors
+
+
+def distance(first, second):
+    return bin((first ^ second) & (1 << 64) - 1).count('1')
+
+
+def color_difference(first, second):
+    """Средняя разница каналов двух наборов цветов, от 0 до 255."""
+    return sum(abs(a - b) for a, b in zip(first, second)) / len(first)
+
+
+def _bands(value):
+    mask = (1 << BAND_BITS) - 1
+    return {
+        f'band_{i}': value >> (i * BAND_BITS) & mask for i in range(BANDS)
+    }
+
+
+def _signed(value):
+    # BigIntegerField знаковое, а хэш — 64 бита без знака.
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def same_picture(first, second):
+    """Одна ли это картинка в полном разрешении, с точностью до пережатия.
+
+    Разница точек усредняется по блокам BLOCK_SIZE x BLOCK_SIZE: пережатие
+    сдвигает все блоки понемногу, а другая подпись или мелкая правка
+    сильно меняет свои блоки.
+    """
+    first.seek(0)
+    second.seek(0)
+    with Image.open(first) as one, Image.open(second) as other:
+        if one.size != other.size:
+            return False
+        difference = ImageChops.difference(
+            one.convert('RGBA'), other.convert('RGBA')
+        )
+    first.seek(0)
+    # По каналам: RGBA уменьшается с умножением на альфу, а у разницы
+    # она почти везде нулевая.
+    return max(
+        band.reduce(BLOCK_SIZE).getextrema()[1]
+        for band in difference.split()
+    ) <= constants.IMAGE_DUPLICATE_BLOCK_DIFFERENCE
+
+
+def find_duplicate(file, value, colors, max_distance=None):
+    """Имя сохранённой картинки, совпадающей с файлом, или None.
+
+    Кандидаты выбираются по совпадению любой полосы хэша, затем по
+    расстоянию и близости цветов. Хэш и цвета считаются по крошечным
+    копиям и не видят, например, разных подписей на одном шаблоне,
+    поэтому повтор подтверждается сравнением в полном разрешении.
+    """
+    if max_distance is None:
+        max_distance = constants.IMAGE_DUPLICATE_DISTANCE
+    # Так хэшируются все однотонные картинки и ровные градиенты.
+    if value in (0, (1 << 64) - 1):
+        return None
+    candidates = ImageHash.objects.filter(
+        reduce(or_, (Q(**{key: band}) for key, band in _bands(value).items())),
+        # Только файлы, на которые ссылаются посты: остальные может в любой
+        # момент удалить collect_media_garbage.
+        image__in=Post.objects.values('image'),
+        colors__isnull=False,
+    ).values_list('image', 'value', 'colors')
+    matches = sorted(
+        (distance(value, stored), name)
+        for name, stored, stored_colors in candidates
+        if distance(value, stored) <= max_distance
+        and color_difference(colors, bytes(stored_colors))
+        <= constants.IMAGE_DUPLICATE_COLOR_DIFFERENCE
+    )
+    storage = Post._meta.get_field('image').storage
+    for _, name in matches:
+        try:
+            with storage.open(name) as stored_file:
+                if same_picture(file, stored_file):
+                    return name
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def remember_hash(name, value, colors):
+    ImageHash.objects.update_or_create(image=name, defaults={
+        'value': _signed(value), 'colors': colors, **_bands(value)
+    })
+
+
+def forget_hashes(names):
+    names = list(names)
+    # Не упираемся в лимит SQLite на число параметров запроса.
+    for start in range(0, len(names), 500):
+        ImageHash.objects.filter(
+            image__in=names[start:start + 500]
+        ).delete()
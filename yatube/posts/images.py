@@ -0,0 +1,62 @@
+import os
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from . import constants
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def _reencode(image):
+    side = constants.IMAGE_MAX_SIDE
+    # JPEG декодируется сразу в уменьшенном масштабе.
+    image.draft(None, (side, side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((side, side), Image.LANCZOS)
+    if _has_alpha(image):
+        image, format_, extension = image.convert('RGBA'), 'PNG', 'png'
+    else:
+        image, format_, extension = image.convert('RGB'), 'JPEG', 'jpg'
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        format_,
+        quality=constants.IMAGE_JPEG_QUALITY,
+        optimize=True,
+        progressive=True,
+    )
+    return buffer.getvalue(), extension
+
+
+def normalize_image(upload):
+    """Приводит загруженную картинку к ограниченному размеру.
+
+    Размер файла и число пикселей проверяются по заголовку, до
+    декодирования, так что «бомбы» отсекаются сразу. Затем картинка
+    поворачивается по EXIF, ужимается до IMAGE_MAX_SIDE и пересохраняется
+    без метаданных: JPEG, а при прозрачности — PNG.
+    """
+    if upload.size > constants.IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            params={'limit': constants.IMAGE_MAX_UPLOAD_SIZE // 2 ** 20},
+        )
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            width, height = image.size
+            if width * height > constants.IMAGE_MAX_PIXELS:
+                raise ValidationError('Слишком большое разрешение картинки.')
+            data, extension = _reencode(image)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # Заголовок цел, а данные битые: это видно только при декодировании.
+        raise ValidationError('Не удалось прочитать картинку.')
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return ContentFile(data, name=f'{name}.{extension}')
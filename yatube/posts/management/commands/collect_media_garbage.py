@@ -0,0 +1,64 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from posts.image_hashes import forget_hashes
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, на которые не ссылается ни один пост, '
+        'вместе с их миниатюрами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд: их пост может '
+                 'быть ещё не сохранён.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.',
+        )
+
+    def _walk(self, storage, directory):
+        directories, files = storage.listdir(directory)
+        for name in files:
+            yield f'{directory}/{name}'
+        for name in directories:
+            yield from self._walk(storage, f'{directory}/{name}')
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        root = field.upload_to.rstrip('/')
+        if not storage.exists(root):
+            return
+        # Один файл может принадлежать многим постам: он жив, пока на него
+        # ссылается хоть один.
+        references = set(
+            Post.objects.exclude(image='').order_by().values_list(
+                'image', flat=True
+            ).distinct()
+        )
+        deadline = time.time() - options['grace']
+        removed = []
+        for name in self._walk(storage, root):
+            if name in references:
+                continue
+            if os.path.getmtime(storage.path(name)) > deadline:
+                continue
+            removed.append(name)
+            if options['verbosity'] > 1 or options['dry_run']:
+                self.stdout.write(name)
+            if not options['dry_run']:
+                delete(ImageFile(name, storage), delete_file=False)
+                storage.delete(name)
+        if not options['dry_run']:
+            forget_hashes(removed)
+        self.stdout.write(f'Удалено файлов: {len(removed)}')
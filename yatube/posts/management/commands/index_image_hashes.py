@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts.image_hashes import fingerprint, remember_hash
+from posts.models import ImageHash, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает перцептивные хэши картинок постов, у которых их нет '
+        'или нет цветов.'
+    )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = set(
+            Post.objects.exclude(image='').values_list('image', flat=True)
+        ) - set(
+            ImageHash.objects.filter(
+                colors__isnull=False
+            ).values_list('image', flat=True)
+        )
+        done = 0
+        for name in sorted(names):
+            try:
+                with storage.open(name) as file:
+                    value, colors = fingerprint(file)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'{name}: {error}')
+                continue
+            remember_hash(name, value, colors)
+            done += 1
+        self.stdout.write(f'Обработано картинок: {done}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.stats import reconcile_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики UserStats по постам, подпискам '
+        'и комментариям.'
+    )
+
+    def handle(self, *args, **options):
+        fixed = reconcile_stats()
+        self.stdout.write(f'Исправлено записей: {fixed}')
@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры картинок всех постов на всех ядрах. Готовые '
+        'пропускаются, так что новые картинки можно готовить запуском '
+        'по расписанию; иначе миниатюры создаст первый показ.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов (по умолчанию — число ядер).',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Удалить существующие миниатюры перед генерацией.',
+        )
+
+    def handle(self, *args, **options):
+        # Одинаковые загрузки делят файл: каждый обрабатываем один раз.
+        names = list(
+            Post.objects.exclude(image='').order_by().values_list(
+                'image', flat=True
+            ).distinct()
+        )
+        if options['force']:
+            # Ключ sorl зависит от хранилища, поэтому не просто имя.
+            storage = Post.image.field.storage
+            for name in names:
+                delete(ImageFile(name, storage), delete_file=False)
+        # Дочерние процессы не должны делить соединения с родителем.
+        connections.close_all()
+        done = 0
+        with ProcessPoolExecutor(
+            max_workers=options['workers'],
+            mp_context=multiprocessing.get_context('fork'),
+        ) as pool:
+            for name in pool.map(generate_thumbnails, names, chunksize=8):
+                done += 1
+                if options['verbosity'] > 1:
+                    self.stdout.write(name)
+        self.stdout.write(f'Обработано картинок: {done}')
@@ -0,0 +1,14 @@
+from django.db import migrations
+
+from posts.search import install_fts, uninstall_fts
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_fts, uninstall_fts),
+    ]
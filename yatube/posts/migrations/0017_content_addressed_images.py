@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:29
+
+import core.storage
+from django.db import migrations, models
+
+from posts.search import install_fts
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_user_stats'),
+    ]
+
+    # SQLite пересоздаёт posts_post при AlterField и теряет триггеры FTS:
+    # ставим их заново в обе стороны.
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, install_fts),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(install_fts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_image_hashes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagehash',
+            name='colors',
+            field=models.BinaryField(null=True, verbose_name='Цвета 8x8'),
+        ),
+    ]
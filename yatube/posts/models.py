@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.db.models.constraints import UniqueConstraint
 
+from core.storage import ContentAddressedStorage
+
 from . import constants
 
 
@@ -63,6 +65,7 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
 
@@ -70,6 +73,16 @@ class Post(models.Model):
         ordering = ['-pub_date']
         verbose_name = 'Публикация'
         verbose_name_plural = 'Публикации'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:constants.SELF_TEXT_LENGTH]
@@ -101,6 +114,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:constants.SELF_TEXT_LENGTH]
@@ -122,3 +141,111 @@ class Follow(models.Model):
         constraints = [
             UniqueConstraint(fields=['user', 'author'], name='follow')
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
+
+
+class Timeline(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    # Копия Post.pub_date: лента читается одним проходом по индексу
+    # (user, -pub_date) без join'а с Follow.
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            UniqueConstraint(fields=['user', 'post'], name='timeline_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'],
+                name='timeline_user_pub_date_idx',
+            )
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя для шапки профиля.
+
+    Меняются сигналами при создании и удалении постов, подписок и
+    комментариев; расхождения чинит команда reconcile_user_stats.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов',
+    )
+    followers = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков',
+    )
+    following = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок',
+    )
+    comments = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Комментариев',
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+
+class ImageHash(models.Model):
+    """Перцептивный хэш (dHash) сохранённой картинки поста.
+
+    64 бита хэша разбиты на четыре 16-битные полосы с индексами: у картинок
+    на расстоянии Хэмминга до трёх бит хотя бы одна полоса совпадает
+    целиком, так что кандидаты ищутся по индексу, а не перебором.
+    Цвета уменьшенной копии подтверждают совпадение: dHash их не видит.
+    """
+    image = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='Файл картинки',
+    )
+    value = models.BigIntegerField(
+        verbose_name='Хэш',
+    )
+    colors = models.BinaryField(
+        null=True,
+        verbose_name='Цвета 8x8',
+    )
+    band_0 = models.PositiveIntegerField(db_index=True)
+    band_1 = models.PositiveIntegerField(db_index=True)
+    band_2 = models.PositiveIntegerField(db_index=True)
+    band_3 = models.PositiveIntegerField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Хэш картинки'
+        verbose_name_plural = 'Хэши картинок'
+
+    def __str__(self):
+        return self.image
@@ -0,0 +1,79 @@
+import re
+
+from django.db import connection
+
+FTS_TABLE = 'posts_post_fts'
+
+# Внешний content-индекс FTS5 над posts_post.text. Триггеры держат его
+# в актуальном состоянии при любых изменениях таблицы, включая
+# bulk_create() и update(), которые не шлют сигналов.
+FTS_INSTALL_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"text, content='posts_post', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 1')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai "
+    f"AFTER INSERT ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad "
+    f"AFTER DELETE ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    f"VALUES ('delete', old.id, old.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au "
+    f"AFTER UPDATE OF text ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    f"VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+FTS_UNINSTALL_SQL = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+
+
+def install_fts(apps, schema_editor):
+    """Создаёт индекс и триггеры; вызывается из миграций.
+
+    SQLite пересоздаёт таблицу при AlterField, и триггеры на posts_post
+    пропадают, поэтому такие миграции должны вызывать install_fts снова.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in FTS_INSTALL_SQL:
+        schema_editor.execute(sql)
+
+
+def uninstall_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in FTS_UNINSTALL_SQL:
+        schema_editor.execute(sql)
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def search_posts(query, queryset):
+    """Посты, подходящие под запрос, по убыванию релевантности (bm25).
+
+    Каждое слово запроса ищется как префикс, все слова обязательны.
+    Вне SQLite поиск деградирует до icontains по каждому слову.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+    if connection.vendor != 'sqlite':
+        for term in terms:
+            queryset = queryset.filter(text__icontains=term)
+        return queryset
+    match = ' '.join(f'"{term}"*' for term in terms)
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = posts_post.id', f'{FTS_TABLE} MATCH %s'],
+        params=[match],
+        select={'rank': f'bm25({FTS_TABLE})'},
+        order_by=['rank', '-pub_date'],
+    )
@@ -0,0 +1,318 @@
+import copy
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from .cache import (
+    bump_versions, cache_aliases, cache_objects, forget_objects,
+    post_count_scopes, post_scopes, shift_counts
+)
+from .follows import forget_following
+from .models import Comment, Follow, Group, Post, Timeline, User, UserStats
+from .stats import shift_stats
+
+# Уникальные поля, по которым вью ищут объекты через кэш.
+OBJECT_ALIASES = {Group: ('slug',), User: ('username',)}
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if not created:
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=instance.author_id
+    ).values_list('user_id', flat=True)
+    Timeline.objects.bulk_create(
+        [
+            Timeline(user_id=user_id, post=instance,
+                     pub_date=instance.pub_date)
+            for user_id in follower_ids
+        ],
+        ignore_conflicts=True,
+    )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if not created:
+        return
+    posts = Post.objects.filter(
+        author_id=instance.author_id
+    ).values_list('id', 'pub_date')
+    Timeline.objects.bulk_create(
+        [
+            Timeline(user_id=instance.user_id, post_id=post_id,
+                     pub_date=pub_date)
+            for post_id, pub_date in posts.iterator()
+        ],
+        ignore_conflicts=True,
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    # Записи удалённых постов убирает CASCADE на Timeline.post.
+    Timeline.objects.filter(
+        user_id=instance.user_id,
+        post__author_id=instance.author_id,
+    ).delete()
+
+
+def bump_after_commit(*scopes):
+    # Версии сдвигаются только после коммита: иначе параллельный запрос
+    # собрал бы страницу из старых строк уже под новой версией.
+    transaction.on_commit(partial(bump_versions, *scopes))
+
+
+def follower_scopes(author_id):
+    return [
+        f'follow:{user_id}'
+        for user_id in Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+    ]
+
+
+def reader_scopes(author_ids):
+    """Профили авторов и ленты их подписчиков."""
+    return [
+        *(
+            f'author:{username}'
+            for username in User.objects.filter(
+                pk__in=author_ids
+            ).values_list('username', flat=True)
+        ),
+        *(
+            f'follow:{user_id}'
+            for user_id in Follow.objects.filter(
+                author_id__in=author_ids
+            ).values_list('user_id', flat=True).distinct()
+        ),
+    ]
+
+
+@receiver(pre_save, sender=Group)
+@receiver(pre_save, sender=User)
+def remember_previous_alias(sender, instance, update_fields=None, **kwargs):
+    # Страницы по старому slug/username тоже надо сбросить.
+    field, = OBJECT_ALIASES[sender]
+    instance._previous_alias = None
+    if instance.pk is None or (
+        update_fields is not None and field not in update_fields
+    ):
+        return
+    instance._previous_alias = sender._default_manager.filter(
+        pk=instance.pk
+    ).values_list(field, flat=True).first()
+
+
+def renamed_scope(instance, prefix, value):
+    previous = getattr(instance, '_previous_alias', None)
+    return [f'{prefix}:{previous}'] if previous and previous != value else []
+
+
+@receiver(pre_save, sender=Post)
+def invalidate_previous_group(sender, instance, **kwargs):
+    instance._previous_group_id = None
+    if instance.pk is None:
+        return
+    group_id, slug = Post.objects.filter(pk=instance.pk).values_list(
+        'group_id', 'group__slug'
+    ).first() or (None, None)
+    instance._previous_group_id = group_id
+    if slug:
+        bump_after_commit(f'group:{slug}')
+
+
+# Счётчики и объекты в кэше меняются только после коммита: откат
+# транзакции иначе оставил бы их неверными до конца таймаута.
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(
+            shift_counts, 1, *post_count_scopes(instance.group_id)
+        ))
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        if previous_group_id:
+            transaction.on_commit(partial(
+                shift_counts, -1, f'group:{previous_group_id}'
+            ))
+        if instance.group_id:
+            transaction.on_commit(partial(
+                shift_counts, 1, f'group:{instance.group_id}'
+            ))
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        shift_counts, -1, *post_count_scopes(instance.group_id)
+    ))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    bump_after_commit(
+        *post_scopes(instance), *follower_scopes(instance.author_id)
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    bump_after_commit(
+        f'post:{instance.post_id}', f'author:{instance.author.username}'
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    bump_after_commit(
+        f'follow:{instance.user_id}',
+        f'author:{instance.author.username}',
+        f'author:{instance.user.username}',
+    )
+    transaction.on_commit(partial(forget_following, instance.user_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, created=False, **kwargs):
+    scopes = [
+        'posts',
+        f'group:{instance.slug}',
+        f'card:group:{instance.pk}',
+        *renamed_scope(instance, 'group', instance.slug),
+    ]
+    if not created:
+        # Название группы показывают и профили её авторов, и ленты их
+        # подписчиков. При удалении посты уже отвязаны от группы.
+        post_ids = getattr(instance, '_post_ids', None)
+        posts = (
+            Post.objects.filter(group_id=instance.pk) if post_ids is None
+            else Post.objects.filter(pk__in=post_ids)
+        )
+        scopes.extend(reader_scopes(posts.values('author_id')))
+    bump_after_commit(*scopes)
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    # Посты группы обнулят group_id одним UPDATE, без сигналов.
+    instance._post_ids = list(
+        Post.objects.filter(group=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Group)
+def forget_group_posts(sender, instance, **kwargs):
+    post_ids = getattr(instance, '_post_ids', ())
+    if not post_ids:
+        return
+    transaction.on_commit(partial(
+        forget_objects, *(Post(pk=pk) for pk in post_ids)
+    ))
+    bump_after_commit(*(f'post:{pk}' for pk in post_ids))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_pages(sender, instance, created=False,
+                          update_fields=None, **kwargs):
+    # Вход сохраняет только last_login, которого нет ни на одной странице.
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    scopes = [
+        f'author:{instance.username}',
+        f'follow:{instance.pk}',
+        f'card:user:{instance.pk}',
+        *renamed_scope(instance, 'author', instance.username),
+    ]
+    if not created:
+        # Имя и ссылка автора есть в ленте, в лентах его подписчиков и на
+        # страницах групп с его постами — см. invalidate_group_pages.
+        scopes.append('posts')
+        scopes.extend(follower_scopes(instance.pk))
+        scopes.extend(
+            f'group:{slug}'
+            for slug in Post.objects.filter(
+                author_id=instance.pk, group__isnull=False
+            ).values_list('group__slug', flat=True).distinct()
+        )
+    bump_after_commit(*scopes)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=User)
+def write_through_object(sender, instance, **kwargs):
+    # Псевдонимы перезаписываются вместе с объектом: иначе старый pk по
+    # тому же slug/username жил бы до конца таймаута.
+    # Копия — состояние на момент сохранения: до коммита объект ещё может
+    # поменяться, а delete() обнуляет pk.
+    saved = copy.copy(instance)
+
+    def write_through():
+        cache_objects(saved)
+        cache_aliases(saved, *OBJECT_ALIASES.get(sender, ()))
+    transaction.on_commit(write_through)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=User)
+def forget_deleted_object(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        forget_objects,
+        copy.copy(instance),
+        aliases=OBJECT_ALIASES.get(sender, ()),
+    ))
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_user_post(sender, instance, created, **kwargs):
+    if created:
+        shift_stats(instance.author_id, posts=1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_user_post(sender, instance, **kwargs):
+    shift_stats(instance.author_id, posts=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_user_comment(sender, instance, created, **kwargs):
+    if created:
+        shift_stats(instance.author_id, comments=1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_user_comment(sender, instance, **kwargs):
+    shift_stats(instance.author_id, comments=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        shift_stats(instance.user_id, following=1)
+        shift_stats(instance.author_id, followers=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    shift_stats(instance.user_id, following=-1)
+    shift_stats(instance.author_id, followers=-1)
@@ -0,0 +1,88 @@
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+# Поле UserStats -> (модель, поле-ссылка на пользователя).
+STATS_SOURCES = {
+    'posts': ('Post', 'author'),
+    'followers': ('Follow', 'author'),
+    'following': ('Follow', 'user'),
+    'comments': ('Comment', 'author'),
+}
+
+
+def shift_stats(user_id, **deltas):
+    """Сдвигает счётчики одним UPDATE, без чтения строки.
+
+    Если строки ещё нет (пользователь создан в обход сигналов), при росте
+    счётчиков она создаётся пересчётом по таблицам. Уменьшение строку не
+    создаёт: пользователь может удаляться каскадом.
+    """
+    UserStats = global_apps.get_model('posts', 'UserStats')
+    updated = UserStats.objects.filter(user_id=user_id).update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+    if not updated and min(deltas.values()) > 0:
+        reconcile_stats(user_ids=[user_id])
+
+
+def get_stats(user):
+    """Счётчики пользователя одним чтением строки."""
+    UserStats = global_apps.get_model('posts', 'UserStats')
+    stats = UserStats.objects.filter(user=user).first()
+    if stats is None:
+        reconcile_stats(user_ids=[user.pk])
+        stats = UserStats.objects.get(user=user)
+    return stats
+
+
+def _actual_counts(apps, user_ids=None):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    users = User.objects.order_by('pk')
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    annotations = {}
+    for field, (model_name, user_field) in STATS_SOURCES.items():
+        model = apps.get_model('posts', model_name)
+        counts = model.objects.filter(
+            **{user_field: OuterRef('pk')}
+        ).order_by().values(user_field).annotate(
+            total=Count('pk')
+        ).values('total')
+        annotations[f'actual_{field}'] = Coalesce(Subquery(counts), 0)
+    return users.annotate(**annotations).values('pk', *annotations)
+
+
+def reconcile_stats(apps=global_apps, user_ids=None):
+    """Пересчитывает счётчики по таблицам; возвращает число исправлений."""
+    UserStats = apps.get_model('posts', 'UserStats')
+    with transaction.atomic():
+        current = UserStats.objects.all()
+        if user_ids is not None:
+            current = current.filter(user_id__in=user_ids)
+        current = {stats.user_id: stats for stats in current}
+        missing, changed = [], []
+        for row in _actual_counts(apps, user_ids).iterator():
+            actual = {
+                field: row[f'actual_{field}'] for field in STATS_SOURCES
+            }
+            stats = current.get(row['pk'])
+            if stats is None:
+                missing.append(UserStats(user_id=row['pk'], **actual))
+            elif any(
+                getattr(stats, field) != value
+                for field, value in actual.items()
+            ):
+                for field, value in actual.items():
+                    setattr(stats, field, value)
+                changed.append(stats)
+        UserStats.objects.bulk_create(missing, ignore_conflicts=True)
+        UserStats.objects.bulk_update(changed, list(STATS_SOURCES))
+    return len(missing) + len(changed)
+
+
+def backfill_stats(apps, schema_editor):
+    reconcile_stats(apps)
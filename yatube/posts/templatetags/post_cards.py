@@ -0,0 +1,61 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .. import constants
+from ..cache import get_versions
+from ..thumbnails import prefetch_variants
+
+register = template.Library()
+
+CARD_KEY = 'posts:card:{variant}:{pk}:{versions}'
+
+
+def card_scopes(post):
+    # Не author:/group: — они сдвигаются при каждом новом посте, а карточке
+    # важны только правки самих автора и группы.
+    scopes = [f'post:{post.pk}', f'card:user:{post.author_id}']
+    if post.group_id:
+        scopes.append(f'card:group:{post.group_id}')
+    return scopes
+
+
+@register.simple_tag
+def post_cards(posts, variant):
+    """HTML карточек постов, собранный из кэша одним get_many.
+
+    Ключ карточки содержит версии поста, его автора и группы, так что
+    правка любого из них отрисует карточку заново. Отрисовываются только
+    промахи, а метаданные их миниатюр читаются заранее одним запросом.
+    """
+    posts = list(posts)
+    versions = get_versions(
+        *{scope for post in posts for scope in card_scopes(post)}
+    )
+    keys = [
+        CARD_KEY.format(
+            variant=variant,
+            pk=post.pk,
+            versions='.'.join(
+                str(versions[scope]) for scope in card_scopes(post)
+            ),
+        )
+        for post in posts
+    ]
+    cards = cache.get_many(keys)
+    prefetch_variants(
+        [post.image for key, post in zip(keys, posts) if key not in cards]
+    )
+    missing = {
+        key: render_to_string(
+            'posts/includes/post_card.html',
+            {'post': post, 'variant': variant},
+        )
+        for key, post in zip(keys, posts)
+        if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, constants.CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,37 @@
+from django import template
+from django.template.loader import render_to_string
+
+from .. import constants
+from ..thumbnails import image_variants, prefetch_variants, variant_formats
+
+register = template.Library()
+
+
+def _srcset(variants):
+    return ', '.join(f'{thumb.url} {width}w' for width, thumb in variants)
+
+
+@register.simple_tag
+def post_picture(image):
+    """<picture> картинки поста: AVIF/WebP-источники и JPEG по ширинам.
+
+    Браузер сам выбирает самый лёгкий подходящий файл по srcset и sizes.
+    """
+    if not image:
+        return ''
+    prefetch_variants([image])
+    jpeg = image_variants(image)
+    width, height = constants.IMAGE_CROP_SIZE
+    return render_to_string('posts/includes/picture.html', {
+        'sources': [
+            (
+                f'image/{format_.lower()}',
+                _srcset(image_variants(image, format_)),
+            )
+            for format_ in variant_formats()
+        ],
+        'srcset': _srcset(jpeg),
+        'fallback': jpeg[-1][1],
+        'width': width,
+        'height': height,
+    })
@@ -0,0 +1,340 @@
+import time
+from array import array
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import Http404
+from django.test import Client, SimpleTestCase, TestCase
+from django.urls import reverse
+
+from ..cache import cached, get_cached_object_or_404, get_versions
+from ..follows import FOLLOWING_KEY, followed_among, is_following
+from ..models import Follow, Group, Post
+from ..templatetags.post_cards import post_cards
+from .utils import OnCommitMixin
+
+User = get_user_model()
+
+
+class CachedTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def rebuild(self):
+        self.calls += 1
+        return f'значение {self.calls}'
+
+    def expire(self, key):
+        entry = cache.get(key)
+        entry['expires'] = time.time() - 1
+        cache.set(key, entry)
+
+    def test_fresh_value_is_built_once(self):
+        self.assertEqual(cached('key', self.rebuild, 60), 'значение 1')
+        self.assertEqual(cached('key', self.rebuild, 60), 'значение 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_expired_value_is_rebuilt_by_lock_holder(self):
+        cached('key', self.rebuild, 60)
+        self.expire('key')
+        self.assertEqual(cached('key', self.rebuild, 60), 'значение 2')
+        self.assertFalse(cache.has_key('key:lock'))
+
+    def test_stale_value_is_served_while_rebuild_in_progress(self):
+        cached('key', self.rebuild, 60)
+        self.expire('key')
+        cache.add('key:lock', True)
+        self.assertEqual(cached('key', self.rebuild, 60), 'значение 1')
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(cache.has_key('key:lock'))
+
+    def test_missing_value_waits_then_builds_without_lock(self):
+        cache.add('key:lock', True)
+        self.assertEqual(
+            cached('key', self.rebuild, 60, wait=0.1), 'значение 1'
+        )
+        self.assertTrue(cache.has_key('key:lock'))
+
+    def test_uncacheable_value_is_not_stored(self):
+        cached('key', self.rebuild, 60, cacheable=lambda value: False)
+        cached('key', self.rebuild, 60, cacheable=lambda value: False)
+        self.assertEqual(self.calls, 2)
+
+    def test_early_refresh_rebuilds_before_expiry(self):
+        cached('key', self.rebuild, 60)
+        entry = cache.get('key')
+        entry['delta'] = 10 ** 6
+        cache.set('key', entry)
+        self.assertEqual(
+            cached('key', self.rebuild, 60, early_refresh_beta=1),
+            'значение 2',
+        )
+        self.assertEqual(cached('key', self.rebuild, 60), 'значение 2')
+
+
+class PostCardsTests(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_user = User.objects.create_user(username='test-user')
+        cls.test_group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(3):
+            Post.objects.create(
+                author=cls.test_user,
+                group=cls.test_group,
+                text=f'Тестовый текст {i}',
+            )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def cards(self, variant='feed'):
+        return post_cards(
+            Post.objects.select_related('author', 'group'), variant
+        )
+
+    def test_cards_are_rendered_once(self):
+        cards = self.cards()
+        self.assertEqual(len(cards), 3)
+        self.assertIn('Тестовый текст 2', cards[0])
+        with mock.patch(
+            'posts.templatetags.post_cards.render_to_string'
+        ) as render:
+            self.assertEqual(self.cards(), cards)
+        render.assert_not_called()
+
+    def test_variants_are_cached_separately(self):
+        self.assertIn('Тестовая группа', self.cards('feed')[0])
+        self.assertNotIn('Тестовая группа', self.cards('group')[0])
+
+    def test_changes_rerender_only_affected_cards(self):
+        self.cards()
+        post = Post.objects.first()
+        post.text = 'Изменённый текст'
+        post.save()
+        self.commit()
+        with mock.patch(
+            'posts.templatetags.post_cards.render_to_string',
+            return_value='<article>заново</article>',
+        ) as render:
+            cards = self.cards()
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(cards[0], '<article>заново</article>')
+        self.test_group.title = 'Новое название'
+        self.test_group.save()
+        self.commit()
+        self.assertIn('Новое название', self.cards()[1])
+
+
+class ObjectCacheTests(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_user = User.objects.create_user(username='test-user')
+        cls.test_group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.test_post = Post.objects.create(
+            author=cls.test_user,
+            group=cls.test_group,
+            text='Тестовый текст',
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def get_post(self):
+        return get_cached_object_or_404(
+            Post, related=('author', 'group'), pk=self.test_post.pk
+        )
+
+    def test_repeated_lookups_do_not_query(self):
+        self.get_post()
+        get_cached_object_or_404(User, username='test-user')
+        with self.assertNumQueries(0):
+            post = self.get_post()
+            self.assertEqual(post.author.username, 'test-user')
+            self.assertEqual(post.group.slug, 'test-slug')
+            self.assertEqual(
+                get_cached_object_or_404(User, username='test-user'),
+                self.test_user,
+            )
+
+    def test_save_writes_through(self):
+        self.get_post()
+        group = Group.objects.get(pk=self.test_group.pk)
+        group.title = 'Новое название'
+        group.save()
+        self.assertEqual(self.get_post().group.title, 'Тестовая группа')
+        self.commit()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_post().group.title, 'Новое название')
+
+    def test_old_slug_is_not_served_after_rename(self):
+        get_cached_object_or_404(Group, slug='test-slug')
+        group = Group.objects.get(pk=self.test_group.pk)
+        group.slug = 'new-slug'
+        group.save()
+        self.commit()
+        with self.assertRaises(Http404):
+            get_cached_object_or_404(Group, slug='test-slug')
+        self.assertEqual(
+            get_cached_object_or_404(Group, slug='new-slug').pk, group.pk
+        )
+
+    def test_deleted_related_object_is_reread(self):
+        self.get_post()
+        Group.objects.get(pk=self.test_group.pk).delete()
+        self.commit()
+        self.assertIsNone(self.get_post().group)
+
+    def test_stale_related_id_drops_cached_object(self):
+        self.get_post()
+        Post.objects.filter(pk=self.test_post.pk).update(group=None)
+        Group.objects.filter(pk=self.test_group.pk).delete()
+        cache.delete(f'posts:object:posts.group:pk:{self.test_group.pk}')
+        self.assertIsNone(self.get_post().group)
+
+    def test_delete_forgets_object(self):
+        self.get_post()
+        Post.objects.get(pk=self.test_post.pk).delete()
+        self.commit()
+        with self.assertRaises(Http404):
+            self.get_post()
+
+
+class FollowingCacheTests(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author-{i}')
+            for i in range(5)
+        ]
+        for author in cls.authors[::2]:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_checks_many_authors_with_one_query(self):
+        author_ids = [author.pk for author in self.authors]
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                followed_among(self.reader.pk, author_ids),
+                set(author_ids[::2]),
+            )
+            self.assertTrue(is_following(self.reader.pk, author_ids[0]))
+            self.assertFalse(is_following(self.reader.pk, author_ids[1]))
+
+    def test_follow_and_unfollow_update_cache(self):
+        author = self.authors[1]
+        self.assertFalse(is_following(self.reader.pk, author.pk))
+        follow = Follow.objects.create(user=self.reader, author=author)
+        self.commit()
+        self.assertTrue(is_following(self.reader.pk, author.pk))
+        follow.delete()
+        self.assertTrue(is_following(self.reader.pk, author.pk))
+        self.commit()
+        self.assertFalse(is_following(self.reader.pk, author.pk))
+
+    def test_unfollow_ignores_stale_cache(self):
+        author = self.authors[0]
+        client = Client()
+        client.force_login(self.reader)
+        cache.set(FOLLOWING_KEY.format(self.reader.pk), array('q'))
+        client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': author.username}
+        ))
+        self.assertFalse(
+            Follow.objects.filter(user=self.reader, author=author).exists()
+        )
+
+
+class ListingInvalidationTests(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_user = User.objects.create_user(username='test-user')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.test_group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.create(
+            author=cls.test_user,
+            group=cls.test_group,
+            text='Тестовый текст',
+        )
+        Follow.objects.create(user=cls.follower, author=cls.test_user)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        # Свежие копии: тесты меняют и удаляют их.
+        self.author = User.objects.get(pk=self.test_user.pk)
+        self.group = Group.objects.get(pk=self.test_group.pk)
+        self.scopes = (
+            'posts',
+            'group:test-slug',
+            'author:test-user',
+            f'follow:{self.follower.pk}',
+            f'card:user:{self.author.pk}',
+        )
+
+    def assertBumped(self, scopes, change):
+        versions = get_versions(*scopes)
+        change()
+        self.assertEqual(get_versions(*scopes), versions)
+        self.commit()
+        new_versions = get_versions(*scopes)
+        for scope in scopes:
+            with self.subTest(scope=scope):
+                self.assertNotEqual(new_versions[scope], versions[scope])
+
+    def test_login_does_not_invalidate_pages(self):
+        versions = get_versions(*self.scopes)
+        self.author.save(update_fields=['last_login'])
+        self.commit()
+        self.assertEqual(get_versions(*self.scopes), versions)
+
+    def test_profile_change_invalidates_listings(self):
+        self.author.first_name = 'Новое имя'
+        self.assertBumped(self.scopes, self.author.save)
+
+    def test_rename_invalidates_old_profile(self):
+        self.author.username = 'renamed-user'
+        self.assertBumped(('author:test-user',), self.author.save)
+
+    def test_group_change_invalidates_listings(self):
+        self.group.title = 'Новое название'
+        self.group.slug = 'new-slug'
+        self.assertBumped(
+            (
+                'posts',
+                'group:test-slug',
+                'group:new-slug',
+                'author:test-user',
+                f'follow:{self.follower.pk}',
+            ),
+            self.group.save,
+        )
+
+    def test_group_delete_invalidates_authors(self):
+        self.assertBumped(
+            ('author:test-user', f'follow:{self.follower.pk}'),
+            self.group.delete,
+        )
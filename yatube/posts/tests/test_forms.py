@@ -1,13 +1,25 @@
+import os
 import shutil
 import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from PIL import Image, ImageChops, ImageDraw, ImageOps
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
 from django.contrib.auth import get_user_model
 from http import HTTPStatus
 
-from ..models import Post, Group, Comment
+from .. import constants
+from ..models import Comment, Group, ImageHash, Post
+from ..templatetags.post_images import post_picture
+from ..thumbnails import generate_thumbnails, variant_formats
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -35,6 +47,9 @@ class PostFormTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        # Метаданные миниатюр sorl лежат в кэше, а файлы — во временной
+        # MEDIA_ROOT: одинаковые картинки получают одинаковые имена.
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.create_user(username='test-user')
         self.authorized_client = Client()
@@ -69,6 +84,273 @@ class PostFormTests(TestCase):
         self.assertEqual(post.group.title, 'Тестовая группа')
         self.assertTrue(post.image)
 
+    def test_image_upload_does_not_generate_thumbnails(self):
+        with mock.patch.object(
+            default.backend, '_create_thumbnail'
+        ) as create, mock.patch(
+            'django.db.transaction.on_commit', side_effect=lambda func: func()
+        ):
+            self.authorized_client.post(self.url_post_create, data={
+                'text': 'Тестовый текст формы',
+                'image': self.uploaded_image,
+            })
+        self.assertTrue(Post.objects.get().image)
+        create.assert_not_called()
+
+    def test_generated_thumbnails_are_reused(self):
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=self.uploaded_image,
+        )
+        generate_thumbnails(post.image.name)
+        with mock.patch(
+            'sorl.thumbnail.base.ThumbnailBackend._create_thumbnail'
+        ) as create:
+            response = self.guest_client.get(
+                reverse('posts:post_details', args=(post.id,))
+            )
+        create.assert_not_called()
+        self.assertContains(response, '/media/cache/')
+
+    def test_forced_regeneration_drops_stored_thumbnails(self):
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=self.uploaded_image,
+        )
+        generate_thumbnails(post.image.name)
+        source = ImageFile(post.image.name, post.image.storage)
+        self.assertIsNotNone(default.kvstore.get(source))
+        with mock.patch(
+            'posts.management.commands.regenerate_thumbnails'
+            '.ProcessPoolExecutor'
+        ):
+            call_command(
+                'regenerate_thumbnails', force=True, stdout=StringIO()
+            )
+        self.assertIsNone(default.kvstore.get(source))
+
+    def test_regenerate_thumbnails_processes_shared_image_once(self):
+        for text in ('Пост с картинкой', 'Повтор картинки'):
+            Post.objects.create(
+                text=text,
+                author=self.user,
+                image=SimpleUploadedFile('small.gif', self.small_gif),
+            )
+        with mock.patch(
+            'posts.management.commands.regenerate_thumbnails'
+            '.ProcessPoolExecutor'
+        ) as executor:
+            call_command('regenerate_thumbnails', stdout=StringIO())
+        pool = executor.return_value.__enter__.return_value
+        names = pool.map.call_args[0][1]
+        self.assertEqual(names, [Post.objects.first().image.name])
+
+    def test_thumbnail_metadata_is_read_in_one_query(self):
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=self.uploaded_image,
+        )
+        generate_thumbnails(post.image.name)
+        with mock.patch.object(
+            cache, 'get_many', wraps=cache.get_many
+        ) as get_many, mock.patch.object(cache, 'get') as get:
+            post_picture(post.image)
+        get_many.assert_called_once()
+        get.assert_not_called()
+
+    def test_picture_offers_every_width(self):
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=self.uploaded_image,
+        )
+        response = self.guest_client.get(
+            reverse('posts:post_details', args=(post.id,))
+        )
+        self.assertContains(response, '<picture>')
+        for width in (480, 720, 960):
+            with self.subTest(width=width):
+                self.assertContains(response, f' {width}w')
+
+    def test_variant_formats_follow_pillow_support(self):
+        self.addCleanup(variant_formats.cache_clear)
+        saved = {
+            name: handler for name, handler in Image.SAVE.items()
+            if name not in ('AVIF', 'WEBP')
+        }
+        with mock.patch.dict(Image.SAVE, saved, clear=True):
+            variant_formats.cache_clear()
+            self.assertEqual(variant_formats(), ())
+            Image.SAVE['WEBP'] = mock.Mock()
+            variant_formats.cache_clear()
+            self.assertEqual(variant_formats(), ('WEBP',))
+
+    def photo(self, size=(300, 200), orientation=6):
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile(
+            'photo.jpeg', buffer.getvalue(), content_type='image/jpeg'
+        )
+
+    @mock.patch.object(constants, 'IMAGE_MAX_SIDE', 100)
+    def test_uploaded_image_is_normalized(self):
+        self.authorized_client.post(self.url_post_create, data={
+            'text': 'Тестовый текст формы',
+            'image': self.photo(),
+        })
+        post = Post.objects.get()
+        self.assertRegex(
+            post.image.name,
+            r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$',
+        )
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (67, 100))
+            self.assertEqual(image.format, 'JPEG')
+            self.assertNotIn('exif', image.info)
+
+    @mock.patch.object(constants, 'IMAGE_MAX_PIXELS', 1000)
+    def test_oversized_image_is_rejected(self):
+        with mock.patch('posts.images.ImageOps.exif_transpose') as decode:
+            response = self.authorized_client.post(
+                self.url_post_create,
+                data={'text': 'Тестовый текст формы', 'image': self.photo()},
+            )
+        decode.assert_not_called()
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(
+            response, 'form', 'image', 'Слишком большое разрешение картинки.'
+        )
+
+    def test_truncated_image_is_rejected(self):
+        data = self.photo(size=(600, 400)).read()
+        response = self.authorized_client.post(self.url_post_create, data={
+            'text': 'Тестовый текст формы',
+            'image': SimpleUploadedFile(
+                'photo.jpeg', data[:len(data) // 2], content_type='image/jpeg'
+            ),
+        })
+        self.assertFalse(Post.objects.exists())
+        self.assertFormError(
+            response, 'form', 'image', 'Не удалось прочитать картинку.'
+        )
+
+    def test_same_image_is_stored_once(self):
+        first, second = (
+            Post.objects.create(
+                text='Пост с картинкой',
+                author=self.user,
+                image=SimpleUploadedFile(name, self.small_gif),
+            )
+            for name in ('first.gif', 'second.GIF')
+        )
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.storage.exists(first.image.name))
+
+    def test_reused_image_is_protected_from_garbage_collector(self):
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=self.uploaded_image,
+        )
+        path = post.image.path
+        os.utime(path, (0, 0))
+        post.delete()
+        Post.objects.create(
+            text='Повтор картинки',
+            author=self.user,
+            image=SimpleUploadedFile('again.gif', self.small_gif),
+        )
+        self.assertGreater(os.path.getmtime(path), 0)
+
+    def test_garbage_collector_keeps_referenced_images(self):
+        kept = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=self.uploaded_image,
+        )
+        orphan = Post.objects.create(
+            text='Удалённый пост',
+            author=self.user,
+            image=self.photo(),
+        )
+        storage = orphan.image.storage
+        orphan.delete()
+        out = StringIO()
+        call_command(
+            'collect_media_garbage', grace=0, verbosity=2, stdout=out
+        )
+        self.assertIn(orphan.image.name, out.getvalue())
+        self.assertTrue(storage.exists(kept.image.name))
+        self.assertFalse(storage.exists(orphan.image.name))
+
+    def gradient(self, offset=(0, 0), size=(256, 256), quality=85,
+                 color='white', caption=None):
+        image = ImageOps.colorize(
+            ImageChops.offset(Image.radial_gradient('L'), *offset),
+            'black',
+            color,
+        )
+        if caption:
+            ImageDraw.Draw(image).text((90, 220), caption, fill='black')
+        buffer = BytesIO()
+        image.resize(size).save(buffer, 'JPEG', quality=quality)
+        return SimpleUploadedFile(
+            'gradient.jpg', buffer.getvalue(), content_type='image/jpeg'
+        )
+
+    def create_with_image(self, image):
+        self.authorized_client.post(self.url_post_create, data={
+            'text': 'Тестовый текст формы', 'image': image,
+        })
+        return Post.objects.latest('pk')
+
+    def test_similar_image_reuses_stored_file(self):
+        original = self.create_with_image(self.gradient())
+        repost = self.create_with_image(self.gradient(quality=40))
+        self.assertEqual(repost.image.name, original.image.name)
+        self.assertEqual(ImageHash.objects.count(), 1)
+
+    def test_different_image_is_stored_separately(self):
+        original = self.create_with_image(self.gradient())
+        other = self.create_with_image(self.gradient(offset=(80, 40)))
+        self.assertNotEqual(other.image.name, original.image.name)
+        self.assertEqual(ImageHash.objects.count(), 2)
+
+    def test_same_pattern_in_other_colors_is_stored_separately(self):
+        red = self.create_with_image(self.gradient(color='red'))
+        cyan = self.create_with_image(self.gradient(color='cyan'))
+        self.assertNotEqual(cyan.image.name, red.image.name)
+
+    def test_resized_image_is_stored_separately(self):
+        original = self.create_with_image(self.gradient())
+        smaller = self.create_with_image(self.gradient(size=(180, 180)))
+        self.assertNotEqual(smaller.image.name, original.image.name)
+
+    def test_same_template_with_other_caption_is_stored_separately(self):
+        first = self.create_with_image(self.gradient(caption='first'))
+        second = self.create_with_image(self.gradient(caption='second'))
+        self.assertNotEqual(second.image.name, first.image.name)
+
+    def test_index_image_hashes_fills_missing_hashes(self):
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=self.gradient(),
+        )
+        call_command('index_image_hashes', stdout=StringIO())
+        self.assertTrue(
+            ImageHash.objects.filter(image=post.image.name).exists()
+        )
+        self.assertEqual(
+            self.create_with_image(self.gradient(quality=50)).image.name,
+            post.image.name,
+        )
+
     def test_edit_post(self):
         post = Post.objects.create(
             text='Изначальный текст!!!',
@@ -1,8 +1,15 @@
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import Client, TestCase
+from django.urls import reverse
 
 from .. import constants
-from ..models import Group, Post, Comment
+from ..models import Group, Post, Comment, Follow, UserStats
+from ..stats import get_stats
 
 User = get_user_model()
 
@@ -119,3 +126,58 @@ class PostModelTest(TestCase):
             with self.subTest(value=value):
                 self.assertEqual(
                     comment._meta.get_field(value).help_text, expected)
+
+
+class UserStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        stats = get_stats(user)
+        return (stats.posts, stats.followers, stats.following, stats.comments)
+
+    def test_counts_follow_creates_and_deletes(self):
+        post = Post.objects.create(author=self.author, text='Тестовый текст')
+        comment = Comment.objects.create(
+            author=self.reader, post=post, text='Тестовый комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author), (1, 1, 0, 0))
+        self.assertEqual(self.stats(self.reader), (0, 0, 1, 1))
+        follow.delete()
+        comment.delete()
+        post.delete()
+        self.assertEqual(self.stats(self.author), (0, 0, 0, 0))
+        self.assertEqual(self.stats(self.reader), (0, 0, 0, 0))
+
+    def test_failed_stats_update_rolls_back_the_write(self):
+        post = Post.objects.create(author=self.author, text='Тестовый текст')
+        client = Client()
+        client.force_login(self.reader)
+        with mock.patch(
+            'posts.signals.shift_stats', side_effect=DatabaseError
+        ), self.assertRaises(DatabaseError):
+            client.post(
+                reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+                data={'text': 'Тестовый комментарий'},
+            )
+        self.assertFalse(Comment.objects.exists())
+
+    def test_stats_are_read_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.stats(self.author)
+
+    def test_reconcile_command_fixes_drift(self):
+        Post.objects.bulk_create([
+            Post(author=self.author, text='Пост в обход сигналов')
+            for _ in range(3)
+        ])
+        UserStats.objects.filter(user=self.reader).delete()
+        out = StringIO()
+        call_command('reconcile_user_stats', stdout=out)
+        self.assertIn('Исправлено записей: 2', out.getvalue())
+        self.assertEqual(self.stats(self.author), (3, 0, 0, 0))
+        self.assertEqual(self.stats(self.reader), (0, 0, 0, 0))
@@ -1,10 +1,20 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from http import HTTPStatus
 from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from ..models import Post, Group, Comment, Follow
+from ..cache import get_count
+from ..stats import reconcile_stats
+from ..utils import HasNextPaginator, encode_cursor, page_window
+
+from ..models import Post, Group, Comment, Follow, Timeline
+from .utils import OnCommitMixin
 
 User = get_user_model()
 
@@ -62,6 +72,7 @@ class PostsPagesTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.create_user(username='test-user')
         self.authorized_client = Client()
@@ -199,6 +210,11 @@ class PaginatorViewsTest(TestCase):
             group=cls.test_group)
             for i in range(13)]
         Post.objects.bulk_create(fixtures)
+        # bulk_create() не шлёт сигналов, счётчики пересчитываем сами.
+        reconcile_stats()
+
+    def setUp(self):
+        cache.clear()
 
     def test_first_pages_with_paginator_contains_ten_records(self):
         authorized_client = PaginatorViewsTest.authorized_client
@@ -216,6 +232,36 @@ class PaginatorViewsTest(TestCase):
                 ))
                 self.assertEqual(len(response.context['page_obj']), 10)
 
+    def test_anonymous_index_is_paginated_without_count(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(reverse('posts:index'))
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+        self.assertIsInstance(
+            first.context['page_obj'].paginator, HasNextPaginator
+        )
+        self.assertTrue(first.context['page_obj'].has_next())
+        second = self.client.get(reverse('posts:index') + '?page=2')
+        self.assertEqual(len(second.context['page_obj']), 3)
+        self.assertFalse(second.context['page_obj'].has_next())
+        beyond = self.client.get(reverse('posts:index') + '?page=9')
+        self.assertEqual(beyond.context['page_obj'].number, 1)
+
+    def test_page_window_has_constant_size(self):
+        paginator = Paginator(range(10 ** 5), 10)
+        self.assertEqual(
+            page_window(paginator.page(500)),
+            [1, None, 497, 498, 499, 500, 501, 502, 503, None, 10 ** 4],
+        )
+        self.assertEqual(
+            page_window(paginator.page(1)), [1, 2, 3, 4, None, 10 ** 4]
+        )
+        self.assertEqual(
+            page_window(Paginator(range(30), 10).page(2)), [1, 2, 3]
+        )
+
     def test_second_pages_with_paginator_contains_three_records(self):
         authorized_client = PaginatorViewsTest.authorized_client
         pages_tested = {
@@ -233,7 +279,198 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len(response.context['page_obj']), 3)
 
 
-class IndexCacheTests(TestCase):
+class FollowCursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.follower = User.objects.create_user(username='follower')
+        cls.author = User.objects.create_user(username='author')
+        Follow.objects.create(user=cls.follower, author=cls.author)
+        for i in range(13):
+            Post.objects.create(
+                text='Тестовый текст' + str(i),
+                author=cls.author,
+            )
+        cls.url_follow = reverse('posts:follow_index')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.follower)
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        first = self.authorized_client.get(self.url_follow)
+        first_page = first.context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+        self.assertEqual(first_page[0].text, 'Тестовый текст12')
+        self.assertContains(first, f'?after={first_page.next_cursor}')
+
+        second = self.authorized_client.get(
+            self.url_follow, {'after': first_page.next_cursor}
+        )
+        second_page = second.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertTrue(second_page.has_previous())
+        self.assertFalse(second_page.has_next())
+        self.assertEqual(second_page[0].text, 'Тестовый текст2')
+
+        back = self.authorized_client.get(
+            self.url_follow, {'before': second_page.previous_cursor}
+        )
+        self.assertEqual(
+            [post.text for post in back.context['page_obj']],
+            [post.text for post in first_page],
+        )
+        self.assertFalse(back.context['page_obj'].has_previous())
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        response = self.authorized_client.get(
+            self.url_follow, {'after': 'не-курсор'}
+        )
+        self.assertEqual(
+            response.context['page_obj'][0].text, 'Тестовый текст12'
+        )
+
+    def test_out_of_range_cursor_falls_back_to_first_page(self):
+        cursor = encode_cursor(timezone.now(), 2 ** 64)
+        response = self.authorized_client.get(
+            self.url_follow, {'after': cursor}
+        )
+        self.assertEqual(
+            response.context['page_obj'][0].text, 'Тестовый текст12'
+        )
+
+
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_user = User.objects.create_user(username='test-user')
+        cls.test_post = Post.objects.create(
+            author=cls.test_user,
+            text='Пост с длинным обсуждением',
+        )
+        for i in range(25):
+            Comment.objects.create(
+                author=cls.test_user,
+                post=cls.test_post,
+                text=f'Тестовый комментарий {i}',
+            )
+        cls.url_post_details = reverse(
+            'posts:post_details', kwargs={'post_id': cls.test_post.id}
+        )
+        cls.url_post_comments = reverse(
+            'posts:post_comments', kwargs={'post_id': cls.test_post.id}
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_comments_page(self):
+        response = self.client.get(self.url_post_details)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 20)
+        self.assertEqual(comments[0].text, 'Тестовый комментарий 24')
+        self.assertTrue(comments.has_next())
+        self.assertContains(
+            response, f'?after={comments.next_cursor}', count=2
+        )
+
+    def test_comments_fragment_returns_next_page(self):
+        first_page = self.client.get(self.url_post_details)
+        response = self.client.get(
+            self.url_post_comments,
+            {'after': first_page.context['comments'].next_cursor},
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            [f'Тестовый комментарий {i}' for i in range(4, -1, -1)],
+        )
+        self.assertFalse(comments.has_next())
+        self.assertNotContains(response, 'Показать ещё комментарии')
+
+    def test_out_of_range_cursor_falls_back_to_first_page(self):
+        response = self.client.get(
+            self.url_post_comments,
+            {'after': encode_cursor(timezone.now(), 2 ** 64)},
+        )
+        self.assertEqual(
+            response.context['comments'][0].text, 'Тестовый комментарий 24'
+        )
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_user = User.objects.create_user(username='test-user')
+        cls.cats_post = Post.objects.create(
+            author=cls.test_user,
+            text='Коты и кошки: коты любят спать',
+        )
+        cls.dogs_post = Post.objects.create(
+            author=cls.test_user,
+            text='Собаки любят гулять, а коты нет',
+        )
+        Post.objects.create(
+            author=cls.test_user,
+            text='Совсем другая тема без животных',
+        )
+        cls.url_search = reverse('posts:search')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get(self.url_search, {'q': query})
+        return [post.id for post in response.context['page_obj']]
+
+    def test_search_ranks_matching_posts(self):
+        self.assertEqual(
+            self.search('коты'), [self.cats_post.id, self.dogs_post.id]
+        )
+        self.assertEqual(self.search('соба'), [self.dogs_post.id])
+        self.assertEqual(self.search('коты гулять'), [self.dogs_post.id])
+        self.assertEqual(self.search('жирафы'), [])
+        self.assertEqual(self.search(''), [])
+
+    def test_search_index_follows_table_changes(self):
+        Post.objects.filter(id=self.dogs_post.id).update(
+            text='Теперь тут про жирафов'
+        )
+        self.assertEqual(self.search('жираф'), [self.dogs_post.id])
+        self.assertEqual(self.search('собаки'), [])
+        Post.objects.filter(id=self.dogs_post.id).delete()
+        self.assertEqual(self.search('жираф'), [])
+
+    def test_search_pagination_keeps_query(self):
+        Post.objects.bulk_create(
+            Post(author=self.test_user, text=f'Коты номер {i}')
+            for i in range(12)
+        )
+        response = self.client.get(self.url_search, {'q': 'коты'})
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82%D1%8B&amp;page=2')
+
+    def test_admin_search_uses_full_text_index(self):
+        admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        self.client.force_login(admin_user)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собаки'}
+        )
+        self.assertEqual(
+            [post.id for post in response.context['cl'].result_list],
+            [self.dogs_post.id],
+        )
+
+
+class IndexCacheTests(OnCommitMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -244,6 +481,8 @@ class IndexCacheTests(TestCase):
         cls.url_index = reverse('posts:index')
 
     def setUp(self):
+        super().setUp()
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.create_user(username='test-user-auth')
         self.authorized_client = Client()
@@ -251,15 +490,269 @@ class IndexCacheTests(TestCase):
 
     def test_cache_index_page(self):
         first_state = self.authorized_client.get(self.url_index)
-        post = Post.objects.get(id=self.test_post.id)
-        post.text = 'Изменённый текст'
-        post.save()
+        Post.objects.filter(id=self.test_post.id).update(
+            text='Изменённый в обход сигналов текст'
+        )
         second_state = self.authorized_client.get(self.url_index)
         self.assertEqual(first_state.content, second_state.content)
         cache.clear()
         third_state = self.authorized_client.get(self.url_index)
         self.assertNotEqual(first_state.content, third_state.content)
 
+    def test_post_save_invalidates_index_page(self):
+        first_state = self.authorized_client.get(self.url_index)
+        post = Post.objects.get(id=self.test_post.id)
+        post.text = 'Изменённый текст'
+        post.save()
+        self.commit()
+        second_state = self.authorized_client.get(self.url_index)
+        self.assertNotEqual(first_state.content, second_state.content)
+        self.assertContains(second_state, 'Изменённый текст')
+
+    def test_comment_does_not_invalidate_index_page(self):
+        self.authorized_client.get(self.url_index)
+        Comment.objects.create(
+            author=self.user,
+            post=self.test_post,
+            text='Комментарий не меняет ленту',
+        )
+        second_state = self.authorized_client.get(self.url_index)
+        self.assertTemplateNotUsed(second_state, 'posts/index.html')
+
+    def test_writer_reads_own_writes_past_cache(self):
+        other_client = Client()
+        other_client.force_login(
+            User.objects.create_user(username='other-user')
+        )
+        self.authorized_client.get(self.url_index)
+        Post.objects.filter(id=self.test_post.id).update(
+            text='Изменённый в обход сигналов текст'
+        )
+        self.assertNotContains(
+            other_client.get(self.url_index), 'в обход сигналов'
+        )
+        self.authorized_client.post(
+            reverse('posts:add_comment', args=(self.test_post.id,)),
+            data={'text': 'Комментарий автора записи'},
+        )
+        self.commit()
+        self.assertContains(
+            self.authorized_client.get(self.url_index), 'в обход сигналов'
+        )
+
+    def test_writer_skips_not_modified(self):
+        etag = self.authorized_client.get(self.url_index)['ETag']
+        self.authorized_client.post(
+            reverse('posts:add_comment', args=(self.test_post.id,)),
+            data={'text': 'Комментарий автора записи'},
+        )
+        response = self.authorized_client.get(
+            self.url_index, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_users_share_cached_page_with_own_menu(self):
+        other = User.objects.create_user(username='other-user')
+        other_client = Client()
+        other_client.force_login(other)
+        first_state = self.authorized_client.get(self.url_index)
+        self.assertTemplateUsed(first_state, 'posts/index.html')
+        self.assertContains(first_state, '/profile/test-user-auth/')
+        response = other_client.get(self.url_index)
+        self.assertTemplateNotUsed(response, 'posts/index.html')
+        self.assertContains(response, '/profile/other-user/')
+        self.assertNotContains(response, '/profile/test-user-auth/')
+        self.assertNotContains(response, '<!--hole:')
+        self.assertContains(self.guest_client.get(self.url_index), 'Войти')
+
+    def test_cached_profile_fills_follow_button_per_user(self):
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.test_user)
+        follower_client = Client()
+        follower_client.force_login(follower)
+        url = reverse('posts:profile', kwargs={'username': 'test-user'})
+        self.assertContains(self.authorized_client.get(url), 'Подписаться')
+        response = follower_client.get(url)
+        self.assertTemplateNotUsed(response, 'posts/profile.html')
+        self.assertContains(response, 'Отписаться')
+
+
+class PostCountCacheTests(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_user = User.objects.create_user(username='test-user')
+        cls.test_group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def counts(self):
+        return (
+            get_count('posts', Post.objects.all()),
+            get_count(f'group:{self.test_group.pk}', self.test_group.posts),
+        )
+
+    def test_counts_follow_create_and_delete(self):
+        self.assertEqual(self.counts(), (0, 0))
+        post = Post.objects.create(
+            author=self.test_user,
+            group=self.test_group,
+            text='Тестовый текст',
+        )
+        self.assertEqual(self.counts(), (0, 0))
+        self.commit()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts(), (1, 1))
+        post.delete()
+        self.commit()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts(), (0, 0))
+
+    def test_counts_follow_group_change(self):
+        post = Post.objects.create(
+            author=self.test_user,
+            group=self.test_group,
+            text='Тестовый текст',
+        )
+        self.commit()
+        self.counts()
+        get_count(f'group:{self.other_group.pk}', self.other_group.posts)
+        post.group = self.other_group
+        post.save()
+        self.commit()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts(), (1, 0))
+            self.assertEqual(get_count(
+                f'group:{self.other_group.pk}', self.other_group.posts
+            ), 1)
+
+    def test_profile_shows_cached_count(self):
+        Post.objects.create(author=self.test_user, text='Тестовый текст')
+        response = self.client.get(reverse(
+            'posts:profile', kwargs={'username': self.test_user.username}
+        ))
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        self.assertContains(response, 'Всего постов: 1')
+
+
+class ConditionalGetTests(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_user = User.objects.create_user(username='test-user')
+        cls.test_group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.test_post = Post.objects.create(
+            author=cls.test_user,
+            group=cls.test_group,
+            text='Тестовый текст',
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.test_user)
+
+    def revalidate(self, client, url):
+        response = client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.has_header('Last-Modified'))
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_return_not_modified(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'test-user'}),
+            reverse('posts:post_details',
+                    kwargs={'post_id': self.test_post.id}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.revalidate(self.authorized_client, url)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+
+    def test_changes_invalidate_validators(self):
+        url_index = reverse('posts:index')
+        url_post_details = reverse(
+            'posts:post_details', kwargs={'post_id': self.test_post.id}
+        )
+        etag_index = self.client.get(url_index)['ETag']
+        etag_post = self.client.get(url_post_details)['ETag']
+        Comment.objects.create(
+            author=self.test_user,
+            post=self.test_post,
+            text='Новый комментарий к посту',
+        )
+        self.commit()
+        response = self.client.get(
+            url_post_details, HTTP_IF_NONE_MATCH=etag_post
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        response = self.client.get(url_index, HTTP_IF_NONE_MATCH=etag_index)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(author=self.test_user, text='Ещё один пост')
+        self.commit()
+        response = self.client.get(url_index, HTTP_IF_NONE_MATCH=etag_index)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_author_and_group_changes_invalidate_post_validators(self):
+        url = reverse(
+            'posts:post_details', kwargs={'post_id': self.test_post.id}
+        )
+        group = Group.objects.get(pk=self.test_group.pk)
+        group.title = 'Новое название'
+        changes = (
+            lambda: Post.objects.create(
+                author=self.test_user, text='Ещё один пост'
+            ),
+            group.save,
+        )
+        for change in changes:
+            etag = self.client.get(url)['ETag']
+            change()
+            self.commit()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_pages_must_be_revalidated(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_new_csrf_secret_invalidates_validators(self):
+        url = reverse(
+            'posts:post_details', kwargs={'post_id': self.test_post.id}
+        )
+        etag = self.authorized_client.get(url)['ETag']
+        self.authorized_client.cookies[settings.CSRF_COOKIE_NAME] = 'x' * 64
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_validators_differ_between_users(self):
+        url_index = reverse('posts:index')
+        etag = self.authorized_client.get(url_index)['ETag']
+        response = self.client.get(url_index, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
 
 class FollowTests(TestCase):
     @classmethod
@@ -273,6 +766,7 @@ class FollowTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_follower = Client()
         self.authorized_following = Client()
         self.authorized_follower.force_login(self.follower)
@@ -304,3 +798,113 @@ class FollowTests(TestCase):
         self.assertEqual(post_text_0, 'Тестовый текст')
         response = self.authorized_following.get('/follow/')
         self.assertNotContains(response, 'Тестовый текст')
+
+    def test_new_post_fans_out_to_followers(self):
+        Follow.objects.create(user=self.follower, author=self.following)
+        new_post = Post.objects.create(
+            author=self.following,
+            text='Новый пост после подписки',
+        )
+        self.assertTrue(Timeline.objects.filter(
+            user=self.follower, post=new_post
+        ).exists())
+        response = self.authorized_follower.get('/follow/')
+        self.assertEqual(
+            response.context['page_obj'][0].text,
+            'Новый пост после подписки',
+        )
+
+    def test_unfollow_prunes_timeline(self):
+        Follow.objects.create(user=self.follower, author=self.following)
+        self.assertEqual(
+            Timeline.objects.filter(user=self.follower).count(), 1
+        )
+        self.authorized_follower.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.following.username},
+        ))
+        self.assertFalse(Timeline.objects.filter(user=self.follower).exists())
+
+    def test_post_delete_prunes_timeline(self):
+        Follow.objects.create(user=self.follower, author=self.following)
+        new_post = Post.objects.create(
+            author=self.following,
+            text='Пост, который удалим',
+        )
+        post_id = new_post.id
+        self.assertTrue(Timeline.objects.filter(post_id=post_id).exists())
+        new_post.delete()
+        self.assertFalse(Timeline.objects.filter(post_id=post_id).exists())
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.test_group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.authors = [
+            User.objects.create_user(username=f'author-{i}')
+            for i in range(5)
+        ]
+        cls.reader = User.objects.create_user(username='reader')
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+            Post.objects.create(
+                text='Тестовый текст',
+                author=author,
+                group=cls.test_group,
+            )
+        cls.test_post = Post.objects.create(
+            text='Пост с комментариями',
+            author=cls.authors[0],
+            group=cls.test_group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def query_count(self, url):
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return int(response['X-Query-Count'])
+
+    def test_pages_fit_query_budget(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author-0'}),
+            reverse('posts:post_details',
+                    kwargs={'post_id': self.test_post.id}),
+            reverse('posts:add_comment',
+                    kwargs={'post_id': self.test_post.id}),
+            reverse('posts:post_comments',
+                    kwargs={'post_id': self.test_post.id}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.query_count(url)
+
+    def test_post_detail_queries_do_not_grow_with_comments(self):
+        url = reverse(
+            'posts:post_details', kwargs={'post_id': self.test_post.id}
+        )
+        Comment.objects.create(
+            post=self.test_post, author=self.authors[1],
+            text='Первый комментарий',
+        )
+        self.query_count(url)
+        one_comment = self.query_count(url)
+        for author in self.authors:
+            Comment.objects.create(
+                post=self.test_post, author=author,
+                text='Ещё один комментарий',
+            )
+        self.assertEqual(self.query_count(url), one_comment)
@@ -0,0 +1,19 @@
+from unittest import mock
+
+
+class OnCommitMixin:
+    """TestCase не коммитит: колбэки on_commit копятся и зовутся commit()."""
+
+    def setUp(self):
+        super().setUp()
+        self.on_commit = []
+        patcher = mock.patch(
+            'django.db.transaction.on_commit',
+            side_effect=self.on_commit.append,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def commit(self):
+        while self.on_commit:
+            self.on_commit.pop(0)()
@@ -0,0 +1,89 @@
+from functools import lru_cache
+
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import ImageFile
+
+from . import constants
+from .models import Post
+
+try:
+    # До Pillow 11 AVIF доступен только через плагин.
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+EXTENSIONS.setdefault('AVIF', 'avif')
+
+
+@lru_cache(maxsize=None)
+def variant_formats():
+    """Современные форматы из IMAGE_VARIANT_FORMATS, которые Pillow умеет
+    кодировать; JPEG есть всегда и сюда не входит."""
+    Image.init()
+    return tuple(
+        format_ for format_ in constants.IMAGE_VARIANT_FORMATS
+        if format_ in Image.SAVE
+    )
+
+
+def variant_options(width, format_='JPEG'):
+    crop_width, crop_height = constants.IMAGE_CROP_SIZE
+    geometry = f'{width}x{round(width * crop_height / crop_width)}'
+    return geometry, {'crop': 'center', 'upscale': True, 'format': format_}
+
+
+def image_variants(image, format_='JPEG'):
+    """[(ширина, миниатюра)] по всем IMAGE_VARIANT_WIDTHS в формате."""
+    variants = []
+    for width in constants.IMAGE_VARIANT_WIDTHS:
+        geometry, options = variant_options(width, format_)
+        variants.append((width, get_thumbnail(image, geometry, **options)))
+    return variants
+
+
+def _thumbnail_file(image, geometry, options):
+    # Повторяет вычисление имени из ThumbnailBackend.get_thumbnail без
+    # обращения к хранилищу метаданных.
+    backend = default.backend
+    options = {**backend.default_options, **options}
+    for key, attr in backend.extra_options:
+        value = getattr(settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(ImageFile(image), geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def prefetch_variants(images):
+    """Загружает метаданные всех вариантов картинок одним запросом к кэшу.
+
+    Работает, если хранилище метаданных sorl умеет prefetch(); иначе
+    ничего не делает.
+    """
+    prefetch = getattr(default.kvstore, 'prefetch', None)
+    images = [image for image in images if image]
+    if prefetch is None or not images:
+        return
+    prefetch([
+        _thumbnail_file(image, *variant_options(width, format_))
+        for image in images
+        for format_ in ('JPEG', *variant_formats())
+        for width in constants.IMAGE_VARIANT_WIDTHS
+    ])
+
+
+def generate_thumbnails(image_name):
+    """Создаёт все варианты картинки для файла из хранилища.
+
+    Ключи sorl совпадают с теми, что посчитает шаблон, поэтому при
+    отрисовке остаётся только прочитать готовые записи. В ключ входит
+    и хранилище, так что файл открывается через хранилище поля Post.image.
+    """
+    image = ImageFile(image_name, Post.image.field.storage)
+    for format_ in ('JPEG', *variant_formats()):
+        image_variants(image, format_)
+    return image_name
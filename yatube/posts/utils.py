@@ -1,9 +1,208 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+
+from django.core.paginator import (
+    EmptyPage, Page, PageNotAnInteger, Paginator
+)
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 
 from . import constants
 
 
-def paginate_page(request, page):
-    paginator = Paginator(page, constants.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def encode_cursor(value, pk):
+    raw = f'{value.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        value, pk = raw.rsplit('|', 1)
+        value = parse_datetime(value)
+        pk = int(pk)
+        # Вне BIGINT SQLite падает с OverflowError.
+        if value is None or not -2 ** 63 <= pk < 2 ** 63:
+            raise ValueError(token)
+        return value, pk
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError(f'Некорректный курсор: {token!r}')
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (field, id) без COUNT(*) и OFFSET.
+
+    Страница строится по непрозрачному курсору ?after=/?before=, поэтому
+    любая страница стоит столько же, сколько первая. get_page() отдаёт
+    обычный Page: номер и число страниц лишь отражают, есть ли соседние.
+    """
+
+    def __init__(self, object_list, per_page, field='pub_date', lookup=None):
+        super().__init__(object_list, per_page)
+        self.field = field
+        self.lookup = lookup or field
+        self._num_pages = 1
+
+    @property
+    def count(self):
+        return None
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    def _filter(self, value, pk, direction):
+        return self.object_list.filter(
+            Q(**{f'{self.lookup}__{direction}': value})
+            | Q(**{self.lookup: value, f'pk__{direction}': pk})
+        )
+
+    def get_page(self, after=None, before=None):
+        try:
+            if before:
+                return self._page_before(*decode_cursor(before))
+            if after:
+                return self._page_after(*decode_cursor(after))
+        except ValueError:
+            pass
+        return self._page_after(None, None)
+
+    def _page_after(self, value, pk):
+        queryset = self.object_list
+        if value is not None:
+            queryset = self._filter(value, pk, 'lt')
+        items = list(
+            queryset.order_by(f'-{self.lookup}', '-pk')[:self.per_page + 1]
+        )
+        has_next = len(items) > self.per_page
+        return self._build_page(
+            items[:self.per_page], value is not None, has_next
+        )
+
+    def _page_before(self, value, pk):
+        items = list(
+            self._filter(value, pk, 'gt').order_by(
+                self.lookup, 'pk'
+            )[:self.per_page + 1]
+        )
+        if not items:
+            return self._page_after(None, None)
+        has_previous = len(items) > self.per_page
+        items = items[:self.per_page][::-1]
+        return self._build_page(items, has_previous, True)
+
+    def _build_page(self, items, has_previous, has_next):
+        number = 2 if has_previous else 1
+        self._num_pages = number + int(has_next)
+        page = Page(items, number, self)
+        page.is_cursor = True
+        page.previous_cursor = self._cursor(items[0]) if items else None
+        page.next_cursor = self._cursor(items[-1]) if items else None
+        return page
+
+    def _cursor(self, obj):
+        return encode_cursor(getattr(obj, self.field), obj.pk)
+
+
+class HasNextPaginator(Paginator):
+    """Пагинатор без COUNT(*).
+
+    Страница читается с одной лишней строкой: по ней видно, есть ли
+    следующая. Общее число страниц неизвестно, num_pages — не больше
+    следующей за текущей.
+    """
+
+    def __init__(self, object_list, per_page):
+        super().__init__(object_list, per_page)
+        self._num_pages = 1
+
+    @property
+    def count(self):
+        return None
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть целым числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def get_page(self, number):
+        try:
+            number = self.validate_number(number)
+        except (PageNotAnInteger, EmptyPage):
+            number = 1
+        bottom = (number - 1) * self.per_page
+        items = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not items and number > 1:
+            return self.get_page(1)
+        self._num_pages = number + int(len(items) > self.per_page)
+        page = Page(items[:self.per_page], number, self)
+        page.is_count_free = True
+        return page
+
+
+def page_window(page, on_each_side=constants.PAGE_WINDOW_ON_EACH_SIDE,
+                on_ends=constants.PAGE_WINDOW_ON_ENDS):
+    """Номера страниц для ссылок: края и окно вокруг текущей.
+
+    None обозначает пропуск. Длина не зависит от числа страниц — то же,
+    что Paginator.get_elided_page_range() из Django 3.2.
+    """
+    number = page.number
+    last = page.paginator.num_pages
+    if last <= (on_each_side + on_ends) * 2:
+        return list(range(1, last + 1))
+    window = []
+    if number > 1 + on_each_side + on_ends + 1:
+        window += [*range(1, on_ends + 1), None]
+        window += range(number - on_each_side, number + 1)
+    else:
+        window += range(1, number + 1)
+    if number < last - on_each_side - on_ends - 1:
+        window += range(number + 1, number + on_each_side + 1)
+        window += [None, *range(last - on_ends + 1, last + 1)]
+    else:
+        window += range(number + 1, last + 1)
+    return window
+
+
+def paginate_page(request, page, cursor=False, count=None, count_free=False,
+                  per_page=constants.POSTS_PER_PAGE, **cursor_options):
+    """Страница page_obj в одном из режимов.
+
+    cursor — keyset по ?after=/?before=, count_free — номера страниц без
+    COUNT(*), иначе обычный Paginator; count подставляет готовое число.
+    """
+    if cursor:
+        paginator = CursorPaginator(page, per_page, **cursor_options)
+        return paginator.get_page(
+            request.GET.get('after'), request.GET.get('before')
+        )
+    if count_free:
+        paginator = HasNextPaginator(page, per_page)
+    else:
+        paginator = Paginator(page, per_page)
+        if count is not None:
+            # Готовое число (например, из кэша) заменяет COUNT(*).
+            paginator.count = count
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj.page_window = page_window(page_obj)
+    return page_obj
+
+
+def paginate_comments(request, post):
+    return paginate_page(
+        request,
+        post.comments.select_related('author'),
+        cursor=True,
+        per_page=constants.COMMENTS_PER_PAGE,
+        field='created',
+    )
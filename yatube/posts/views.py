@@ -1,26 +1,50 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
 from django.contrib import messages
+from django.db import transaction
+from django.db.models import F
+from django.utils.http import urlencode
 
+from core.query_budget import query_budget
+
+from .cache import (
+    cache_page_versioned, conditional_page, follow_scopes,
+    get_cached_object_or_404, get_count, group_scopes, index_scopes,
+    mark_write, post_detail_scopes, profile_scopes
+)
 from .forms import PostForm, CommentForm
 from .models import Post, Group, User, Follow
-from .utils import paginate_page
+from .search import search_posts
+from .stats import get_stats
+from .utils import paginate_comments, paginate_page
 
 
-@cache_page(20)
+@query_budget(5)
+@conditional_page(index_scopes)
+@cache_page_versioned(index_scopes, early_refresh_beta=1)
 def index(request):
     posts = Post.objects.select_related('author', 'group')
-    page_obj = paginate_page(request, posts)
+    if request.user.is_authenticated:
+        page_obj = paginate_page(
+            request, posts, count=get_count('posts', Post.objects.all())
+        )
+    else:
+        # Анонимам точное число страниц не нужно: обходимся без COUNT(*).
+        page_obj = paginate_page(request, posts, count_free=True)
     return render(request, 'posts/index.html', {
         'page_obj': page_obj,
     })
 
 
+@query_budget(5)
+@conditional_page(group_scopes)
+@cache_page_versioned(group_scopes)
 def group(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = get_cached_object_or_404(Group, slug=slug)
     group_posts = group.posts.select_related('author')
-    page_obj = paginate_page(request, group_posts)
+    page_obj = paginate_page(
+        request, group_posts, count=get_count(f'group:{group.pk}', group.posts)
+    )
     return render(request, 'posts/group_list.html', {
         'group': group,
         'posts': group_posts,
@@ -28,43 +52,69 @@ def group(request, slug):
     })
 
 
+@query_budget(6)
+@conditional_page(profile_scopes)
+@cache_page_versioned(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_cached_object_or_404(User, username=username)
+    stats = get_stats(author)
     post_list = author.posts.select_related('group')
-    page_obj = paginate_page(request, post_list)
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user, author=author
-        ).exists()
-    else:
-        following = False
+    page_obj = paginate_page(request, post_list, count=stats.posts)
     context = {
         'author': author,
-        'following': following,
+        'stats': stats,
         'page_obj': page_obj,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(5)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts = search_posts(
+        query, Post.objects.select_related('author', 'group')
+    )
+    page_obj = paginate_page(request, posts, count_free=True)
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page_obj': page_obj,
+        'pagination_query': urlencode({'q': query}) + '&',
+    })
+
+
+@query_budget(5)
+@conditional_page(post_detail_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post.objects.select_related('group'), id=post_id)
-    comments = post.comments.select_related('post')
+    post = get_cached_object_or_404(
+        Post, related=('author', 'group'), pk=post_id
+    )
     context = {
         'post': post,
-        'comments': comments,
+        'comments': paginate_comments(request, post),
+        'author_stats': get_stats(post.author),
         'form': CommentForm(),
     }
     return render(request, 'posts/post_details.html', context)
 
 
+@query_budget(3)
+def post_comments(request, post_id):
+    post = get_cached_object_or_404(Post, pk=post_id)
+    return render(request, 'posts/includes/comments.html', {
+        'post': post,
+        'comments': paginate_comments(request, post),
+    })
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     post = Post.objects.select_related('author')
     form = PostForm(request.POST or None, request.FILES or None)
     if form.is_valid():
-        post_item = form.save(commit=False)
-        post_item.author = request.user
-        post_item.save()
+        form.instance.author = request.user
+        post_item = form.save()
+        mark_write(request)
         return redirect('posts:profile', post_item.author.username)
 
     return render(
@@ -75,8 +125,10 @@ def post_create(request):
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    # Сохраняется свежая строка из БД, а не копия из кэша.
+    post = get_object_or_404(Post, pk=post_id)
     if request.user != post.author:
         messages.error(request, 'Вы не можете редактировать чужие публикации!')
         return redirect('posts:post_details', post_id)
@@ -87,6 +139,7 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        mark_write(request)
         return redirect('posts:post_details', post_id)
     return render(
         request,
@@ -97,29 +150,36 @@ def post_edit(request, post_id):
 
 # Этой вью нет в спринте, сделана для себя.
 @login_required
+@transaction.atomic
 def post_delete(request, post_id):
-    post = get_object_or_404(Post.objects.select_related('group'), id=post_id)
+    post = get_object_or_404(Post.objects.select_related('group'), pk=post_id)
     if request.user == post.author:
         post.delete()
+        mark_write(request)
         return redirect('posts:index')
     messages.error(request, 'Вы не можете удалять чужие публикации!')
     return redirect('posts:post_details', post_id)
 
 
 @login_required
+@query_budget(5)
+@transaction.atomic
 def add_comment(request, post_id):
-    post = get_object_or_404(Post.objects.select_related('author'), id=post_id)
-    comments = post.comments.select_related('post')
+    post = get_cached_object_or_404(
+        Post, related=('author', 'group'), pk=post_id
+    )
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
         comment.save()
+        mark_write(request)
         return redirect('posts:post_details', post_id)
     context = {
         'post': post,
-        'comments': comments,
+        'comments': paginate_comments(request, post),
+        'author_stats': get_stats(post.author),
         'form': form,
     }
     return render(request, 'posts/post_details.html', context)
@@ -127,36 +187,54 @@ def add_comment(request, post_id):
 
 # Этой вью нет в спринте, сделана для себя.
 @login_required
+@transaction.atomic
 def delete_comment(request, post_id, comment_id):
-    post = get_object_or_404(Post.objects.select_related('author'), id=post_id)
+    post = get_cached_object_or_404(Post, related=('author',), pk=post_id)
     comment = get_object_or_404(post.comments.select_related('post'),
                                 id=comment_id)
     if request.user == comment.author:
         comment.delete()
+        mark_write(request)
         return redirect('posts:post_details', post_id)
     messages.error(request, 'Вы не можете удалять чужие комментарии!')
     return redirect('posts:post_details', post_id)
 
 
 @login_required
+@query_budget(3)
+@conditional_page(follow_scopes)
+@cache_page_versioned(follow_scopes, per_user=True)
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginate_page(request, posts)
+    posts = Post.objects.filter(
+        timeline_entries__user=request.user
+    ).annotate(
+        feed_date=F('timeline_entries__pub_date')
+    ).select_related('author', 'group').order_by('-feed_date')
+    page_obj = paginate_page(request, posts, cursor=True, field='feed_date')
     return render(request, 'posts/follow.html', {'page_obj': page_obj})
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_cached_object_or_404(User, username=username)
+    # Кэш подписок мог отстать от БД, поэтому решает сама запись.
     if request.user != author:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        _, created = Follow.objects.get_or_create(
+            user=request.user, author=author
+        )
+        if created:
+            mark_write(request)
     return redirect('posts:profile', username)
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
-    follower = Follow.objects.filter(user=request.user, author=author)
-    if follower.exists():
-        follower.delete()
+    author = get_cached_object_or_404(User, username=username)
+    deleted, _ = Follow.objects.filter(
+        user=request.user, author=author
+    ).delete()
+    if deleted:
+        mark_write(request)
     return redirect('posts:profile', username=author)
@@ -25,6 +25,10 @@ SECRET_KEY = "django-insecure-#%d7waucy02*7)#x-40(yfn+ij_e8oq7^_*^vc1*@*8(omt#re
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Превышение @query_budget во вью: исключение при этом флаге (в тестах),
+# иначе предупреждение в лог.
+QUERY_BUDGET_STRICT = False
+
 ALLOWED_HOSTS = [
     'localhost',
     '127.0.0.1',
@@ -66,10 +70,20 @@ INTERNAL_IPS = [
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
 
+# Тесты берут кэш во временном файле: см. core.test_runner.
+TEST_RUNNER = 'core.test_runner.TemporaryCacheRunner'
+
+# Метаданные миниатюр sorl — в кэше, без таблицы thumbnail_kvstore.
+THUMBNAIL_KVSTORE = 'core.kvstore.CacheKVStore'
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')